@@ -0,0 +1,106 @@
+"""
+Este script define bancas em lote, sem a interface Streamlit, a partir de um arquivo JSONL com um trabalho de mestrado por linha.
+
+Cada linha de entrada deve conter "titulo", "resumo" e "palavras_chave" (separadas por ponto e vírgula) e, opcionalmente, "id".
+Cada linha de saída contém o trabalho e os professores sugeridos, ordenados por pontuação, com as justificativas de relevância.
+
+Uso:
+    python batch.py entrada.jsonl saida.jsonl --modelo ChatGPT --workers 8 --chamadas-por-minuto 300
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from statistics import mean, quantiles
+
+from domain.enums import EtapaEnum, MetodoPodaEnum, ModelEnum, MotorBuscaEnum
+from service import base_professores, definidor_banca, instrumentacao
+from service.limitador import BaldeTokens
+
+
+def processa_registro(indice: int, registro: dict, modelo: str, vector_store, expansao_unica: bool, opcoes_busca: dict) -> dict:
+    '''Define a banca de um trabalho de mestrado e monta a linha de saída, com a duração de cada etapa tirada do rastro da definição'''
+    inicio = time.perf_counter()
+    saida = {"indice": indice, "id": registro.get("id"), "titulo": registro.get("titulo")}
+    rastro = None
+    try:
+        with instrumentacao.rastreia("define_banca", modelo=modelo, expansao_unica=expansao_unica, indice=indice, id=registro.get("id")) as rastro:
+            professores = definidor_banca.define_banca(registro["titulo"], registro.get("resumo", ""), registro.get("palavras_chave", ""),
+                                                       modelo, vector_store, expansao_unica, **opcoes_busca)
+        professores.sort(key=lambda p: p.pontuacao, reverse=True)
+        saida["professores"] = [{"nome": p.nome, "id_professor": p.id_professor, "pontuacao": p.pontuacao,
+                                 "similaridade_media": round(p.similaridade_media(), 4), "justificativa": p.justificativa_relevancia}
+                                for p in professores]
+    except Exception as e:
+        saida["erro"] = repr(e)
+
+    saida["duracao"] = round(time.perf_counter() - inicio, 3)
+    duracoes = rastro.duracoes() if rastro is not None else {}
+    saida["etapas"] = {etapa.value: round(duracoes[etapa.value], 3) for etapa in EtapaEnum if etapa.value in duracoes}
+    return saida
+
+def resume_latencias(nome: str, latencias: list[float]):
+    '''Imprime a média, p50 e p95 das latências, em segundos'''
+    if len(latencias) < 2:
+        print(f"{nome:<12} média {mean(latencias):7.2f}s ({len(latencias)} amostra)")
+        return
+    percentis = quantiles(latencias, n=100)
+    print(f"{nome:<12} média {mean(latencias):7.2f}s | p50 {percentis[49]:7.2f}s | p95 {percentis[94]:7.2f}s | {len(latencias)} amostras")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Define bancas em lote a partir de um arquivo JSONL.")
+    parser.add_argument("entrada", help="Arquivo JSONL com titulo, resumo e palavras_chave por linha")
+    parser.add_argument("saida", help="Arquivo JSONL onde os professores sugeridos serão gravados")
+    parser.add_argument("--modelo", choices=[m.value for m in ModelEnum], default=ModelEnum.CHATGPT.value, help="Modelo de LLM")
+    parser.add_argument("--motor", choices=[m.value for m in MotorBuscaEnum], default=MotorBuscaEnum.CHROMA.value, help="Motor de busca por similaridade")
+    parser.add_argument("--workers", type=int, default=4, help="Quantidade de trabalhos processados simultaneamente")
+    parser.add_argument("--chamadas-por-minuto", type=float, default=300, help="Limite global de chamadas aos LLMs por minuto")
+    parser.add_argument("--metodo-poda", choices=[m.value for m in MetodoPodaEnum], default=definidor_banca.METODO_PODA,
+                        help="Forma de pontuar os candidatos na poda anterior à checagem de relevância")
+    parser.add_argument("--max-candidatos", type=int, default=definidor_banca.MAX_CANDIDATOS_RELEVANCIA, help="Máximo de candidatos enviados ao LLM")
+    parser.add_argument("--pontuacao-minima", type=float, default=definidor_banca.PONTUACAO_MINIMA_PODA, help="Pontuação de poda mínima, entre 0 e 1")
+    parser.add_argument("--sem-busca-hibrida", action="store_true", help="Não soma à busca vetorial os resultados do índice léxico BM25")
+    parser.add_argument("--porta-metricas", type=int, help="Expõe as métricas do processo no formato do Prometheus nesta porta")
+    parser.add_argument("--expansao-unica", action="store_true", help="Expande a consulta em uma única chamada ao LLM")
+    args = parser.parse_args()
+
+    with open(args.entrada, "r", encoding="utf-8") as file:
+        registros = [json.loads(linha) for linha in file if linha.strip()]
+
+    if args.porta_metricas:
+        instrumentacao.inicia_servidor_metricas(args.porta_metricas)
+
+    # Todas as requisições compartilham o mesmo limite de chamadas aos LLMs
+    taxa_por_segundo = args.chamadas_por_minuto / 60
+    definidor_banca.LIMITADOR_LLM = BaldeTokens(taxa_por_segundo, capacidade=max(1.0, taxa_por_segundo))
+    vector_store = base_professores.carrega_professores(args.modelo, motor_busca=args.motor)
+
+    opcoes_busca = {"metodo_poda": args.metodo_poda, "max_candidatos": args.max_candidatos, "pontuacao_minima": args.pontuacao_minima,
+                   "busca_hibrida": not args.sem_busca_hibrida}
+    inicio = time.perf_counter()
+    resultados = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor, open(args.saida, "w", encoding="utf-8") as saida:
+        futuros = [executor.submit(processa_registro, indice, registro, args.modelo, vector_store, args.expansao_unica, opcoes_busca)
+                   for indice, registro in enumerate(registros)]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            saida.flush()
+            print(f"[{len(resultados)}/{len(registros)}] {resultado['titulo']!r} em {resultado['duracao']:.1f}s"
+                  + (f" - erro: {resultado['erro']}" if "erro" in resultado else ""))
+    duracao = time.perf_counter() - inicio
+
+    # Resumo de vazão e de latência por etapa
+    erros = sum("erro" in resultado for resultado in resultados)
+    print(f"\n{len(resultados)} trabalhos em {duracao:.1f}s ({len(resultados) / duracao * 60:.1f} trabalhos/min), {erros} com erro")
+    contadores = instrumentacao.metricas.contadores
+    print(f"{contadores.get('chamadas_llm', 0):g} chamadas ao LLM, {contadores.get('tokens_prompt', 0):g} tokens de prompt, "
+          f"{contadores.get('tokens_resposta', 0):g} de resposta, {contadores.get('chamadas_embeddings', 0):g} chamadas de embeddings")
+    if resultados:
+        resume_latencias("total", [resultado["duracao"] for resultado in resultados])
+    for etapa in EtapaEnum:
+        latencias = [resultado["etapas"][etapa.value] for resultado in resultados if etapa.value in resultado["etapas"]]
+        if latencias:
+            resume_latencias(etapa.value, latencias)
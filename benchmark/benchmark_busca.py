@@ -0,0 +1,76 @@
+'''
+Compara a latência e o recall da busca HNSW do Chroma com a busca exata em memória (BuscaNumpy).
+
+Uso, a partir da raiz do projeto:
+    python -m benchmark.benchmark_busca ChatGPT --consultas 100 --k 5 --repeticoes 20
+
+As consultas são as linhas de pesquisa de professores sorteados do arquivo JSON. Elas são vetorizadas
+uma única vez, de forma que apenas as buscas por vizinhos mais próximos sejam medidas.
+'''
+
+import argparse
+import json
+import random
+import time
+from statistics import mean, quantiles
+
+from domain.enums import ModelEnum
+from service import base_professores
+from service.busca_numpy import BuscaNumpy
+
+
+def sorteia_consultas(quantidade: int, semente: int, caminho_documento = './data/json_curriculos.json') -> list[str]:
+    '''Sorteia textos de consulta a partir das linhas de pesquisa dos professores'''
+    with open(caminho_documento, 'r', encoding='utf-8') as file:
+        professores = json.load(file)
+    linhas = [" ".join(p["linhas_pesquisa"]) for p in professores.values() if p.get("linhas_pesquisa")]
+    return random.Random(semente).sample(linhas, min(quantidade, len(linhas)))
+
+def mede(funcao, repeticoes: int) -> list[float]:
+    '''Executa a função `repeticoes` vezes e retorna as latências em milissegundos'''
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+def resume(nome: str, latencias: list[float]):
+    '''Imprime a média, p50 e p95 das latências'''
+    percentis = quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+    print(f"{nome:<10} média {mean(latencias):8.2f} ms | p50 {percentis[49]:8.2f} ms | p95 {percentis[94]:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara a busca do Chroma com a busca exata em NumPy.")
+    parser.add_argument("modelo", choices=[m.value for m in ModelEnum], help="Modelo cuja base vetorial será usada")
+    parser.add_argument("--consultas", type=int, default=100, help="Quantidade de consultas por lote")
+    parser.add_argument("--k", type=int, default=5, help="Professores retornados por consulta")
+    parser.add_argument("--repeticoes", type=int, default=20, help="Repetições de cada medição")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do sorteio das consultas")
+    args = parser.parse_args()
+
+    vector_store = base_professores.carrega_professores(args.modelo)
+    inicio = time.perf_counter()
+    busca_numpy = BuscaNumpy.from_chroma(vector_store)
+    print(f"Matriz {busca_numpy.matriz.shape} carregada em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    consultas = sorteia_consultas(args.consultas, args.semente)
+    vetores = base_professores.vetoriza_consultas(vector_store.embeddings, consultas)
+
+    # O mesmo lote de consultas é executado nos dois motores, com uma execução de aquecimento
+    busca_chroma = lambda: vector_store._collection.query(query_embeddings=vetores, n_results=args.k, include=["documents", "metadatas", "distances"])
+    busca_exata = lambda: busca_numpy.busca_vetores(vetores, args.k)
+    resultado_chroma, resultado_numpy = busca_chroma(), busca_exata()
+
+    print(f"{len(consultas)} consultas por lote, k={args.k}, {args.repeticoes} repetições")
+    resume("Chroma", mede(busca_chroma, args.repeticoes))
+    resume("NumPy", mede(busca_exata, args.repeticoes))
+
+    # A busca em NumPy é exata; o recall mede quantos dos k vizinhos exatos o HNSW do Chroma encontrou
+    # Os documentos são comparados pelo id do registro no Chroma, presente também nas bases antigas, sem metadados,
+    # já que professores diferentes podem ter o mesmo texto
+    acertos = 0
+    for ids_chroma, exatos in zip(resultado_chroma["ids"], resultado_numpy):
+        acertos += len(set(ids_chroma) & {documento.id for documento, _ in exatos})
+    print(f"Recall@{args.k} do Chroma em relação à busca exata: {acertos / (len(consultas) * args.k):.3f}")
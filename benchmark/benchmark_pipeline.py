@@ -0,0 +1,191 @@
+'''
+Mede o desempenho da definição de banca sem serviços externos, com os substitutos determinísticos de `benchmark.simulados`.
+
+Uso, a partir da raiz do projeto:
+    python -m benchmark.benchmark_pipeline --latencia-llm 0.5 --latencia-embeddings 0.05 --repeticoes 20 --saida resultados.json
+    python -m benchmark.benchmark_pipeline --compara resultados.json
+
+Cenários:
+    ingestao     vetoriza e grava os professores do arquivo JSON em uma base vetorial temporária
+    procura      `procura_professores` com consultas sorteadas das linhas de pesquisa dos professores
+    combinacao   `ListaProfessores.add_professores` com ocorrências repetidas de professores do catálogo
+    define_banca a definição de banca completa, com `--concorrencia` requisições simultâneas
+Os caches persistentes e a gravação dos rastros são desativados, para que as medições não dependam de execuções anteriores.
+Os resultados gravados com `--saida` incluem o commit atual e podem ser comparados entre commits com `--compara`.
+'''
+
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean, quantiles
+
+from benchmark.benchmark_busca import sorteia_consultas
+from benchmark.simulados import ChatSimulado, EmbeddingsHash
+from domain.enums import ModelEnum
+from domain.responses_models import ListaProfessores, ListaVariacoesTitulo, Professor
+from service import base_professores, definidor_banca, instrumentacao, registro_modelos, resiliencia
+
+CENARIOS = ("ingestao", "procura", "combinacao", "define_banca")
+
+
+def estatisticas(latencias: list[float], duracao: float, itens: int) -> dict:
+    '''Resume as latências, em milissegundos, e a vazão, em itens por segundo'''
+    percentis = quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+    return {"amostras": len(latencias), "media_ms": mean(latencias), "p50_ms": percentis[49], "p95_ms": percentis[94],
+            "vazao_por_s": itens / duracao if duracao > 0 else 0.0}
+
+def imprime(nome: str, resultado: dict, unidade: str):
+    print(f"{nome:<13} média {resultado['media_ms']:9.2f} ms | p50 {resultado['p50_ms']:9.2f} ms | p95 {resultado['p95_ms']:9.2f} ms"
+          f" | {resultado['vazao_por_s']:9.2f} {unidade}/s | {resultado['amostras']} amostras")
+
+def mede_ingestao(diretorio: str, embeddings: EmbeddingsHash, repeticoes: int) -> dict:
+    '''Vetoriza e grava todos os professores em uma base vetorial temporária, do zero, a cada repetição'''
+    latencias, documentos = [], len(base_professores.carrega_catalogo())
+    inicio_total = time.perf_counter()
+    for _ in range(repeticoes):
+        shutil.rmtree(diretorio, ignore_errors=True)
+        inicio = time.perf_counter()
+        base_professores.popula_databasevetorial(diretorio, embeddings)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return estatisticas(latencias, time.perf_counter() - inicio_total, documentos * repeticoes)
+
+def mede_procura(vector_store, consultas: list[str], repeticoes: int, titulos_por_busca: int = 8) -> dict:
+    '''Executa `procura_professores` com variações de título e palavras-chave sorteadas das consultas'''
+    aleatorio = random.Random(42)
+    # Execução de aquecimento, que carrega o catálogo e constrói o índice léxico
+    definidor_banca.procura_professores(vector_store, set(), ListaVariacoesTitulo(titulos=consultas[:1]))
+
+    latencias = []
+    inicio_total = time.perf_counter()
+    for _ in range(repeticoes):
+        titulos = aleatorio.sample(consultas, min(titulos_por_busca, len(consultas)))
+        palavras_chave = set(aleatorio.choice(consultas).split()[:6])
+        inicio = time.perf_counter()
+        definidor_banca.procura_professores(vector_store, palavras_chave, ListaVariacoesTitulo(titulos=titulos))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return estatisticas(latencias, time.perf_counter() - inicio_total, repeticoes)
+
+def mede_combinacao(repeticoes: int, ocorrencias: int) -> dict:
+    '''Adiciona `ocorrencias` professores, sorteados com repetição do catálogo, a uma ListaProfessores vazia'''
+    aleatorio = random.Random(42)
+    registros = list(base_professores.carrega_catalogo())
+    latencias = []
+    inicio_total = time.perf_counter()
+    for _ in range(repeticoes):
+        professores = []
+        for posicao in range(ocorrencias):
+            professor = Professor.from_registro(aleatorio.choice(registros))
+            professor.registra_ocorrencia(aleatorio.random(), posicao % 5 + 1)
+            professores.append(professor)
+        inicio = time.perf_counter()
+        ListaProfessores(professores=[]).add_professores(professores)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return estatisticas(latencias, time.perf_counter() - inicio_total, ocorrencias * repeticoes)
+
+def mede_define_banca(vector_store, repeticoes: int, concorrencia: int, expansao_unica: bool) -> dict:
+    '''Executa a definição de banca completa para trabalhos montados a partir de professores sorteados do catálogo'''
+    aleatorio = random.Random(42)
+    registros = [registro for registro in base_professores.carrega_catalogo() if registro.resumo and registro.linhas_pesquisa]
+    trabalhos = [(registro.linhas_pesquisa[0], registro.resumo, ";".join(registro.linhas_pesquisa[:3]))
+                 for registro in aleatorio.sample(registros, min(repeticoes, len(registros)))]
+
+    def define(trabalho):
+        inicio = time.perf_counter()
+        definidor_banca.define_banca(*trabalho, ModelEnum.CHATGPT.value, vector_store, expansao_unica)
+        return (time.perf_counter() - inicio) * 1000
+
+    # Execução de aquecimento, que carrega o catálogo, o índice léxico e as sínteses dos professores
+    define(trabalhos[0])
+
+    inicio_total = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        latencias = list(executor.map(define, trabalhos))
+    return estatisticas(latencias, time.perf_counter() - inicio_total, len(trabalhos))
+
+def imprime_resiliencia():
+    '''Imprime o limiar das duplicatas e o tempo máximo de cada etapa, e as duplicatas, novas tentativas e tempos esgotados'''
+    for etapa, resumo in sorted(resiliencia.resumo_latencias().items()):
+        p50 = f"{resumo['p50'] * 1000:9.2f} ms" if resumo["p50"] is not None else "        -   "
+        print(f"  {etapa:<40} p50 {p50} | hedge após {resumo['limiar_hedge'] * 1000:9.2f} ms | timeout {resumo['timeout']:6.1f} s")
+    contadores = instrumentacao.metricas.contadores
+    print("  " + ", ".join(f"{nome} {contadores.get(nome, 0):g}" for nome in ("hedges_llm", "hedges_vencedores_llm", "novas_tentativas_llm", "timeouts_llm")))
+
+def commit_atual() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compara(resultados: dict, anteriores: dict):
+    '''Imprime a variação percentual do p50, do p95 e da vazão de cada cenário em relação a uma execução anterior'''
+    print(f"\nComparação com {anteriores.get('commit') or 'execução anterior'}:")
+    for cenario, atual in resultados["cenarios"].items():
+        anterior = anteriores.get("cenarios", {}).get(cenario)
+        if anterior is None:
+            continue
+        variacao = lambda chave: (atual[chave] - anterior[chave]) / anterior[chave] * 100 if anterior[chave] else 0.0
+        print(f"{cenario:<13} p50 {variacao('p50_ms'):+7.1f}% | p95 {variacao('p95_ms'):+7.1f}% | vazão {variacao('vazao_por_s'):+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o desempenho da definição de banca com LLM e embeddings simulados.")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS), help="Cenários medidos")
+    parser.add_argument("--repeticoes", type=int, default=20, help="Repetições dos cenários procura, combinacao e define_banca")
+    parser.add_argument("--repeticoes-ingestao", type=int, default=2, help="Repetições da ingestão completa")
+    parser.add_argument("--ocorrencias", type=int, default=2000, help="Professores adicionados por repetição no cenário combinacao")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Definições de banca simultâneas")
+    parser.add_argument("--latencia-llm", type=float, default=0.5, help="Latência média, em segundos, de cada chamada ao LLM")
+    parser.add_argument("--latencia-embeddings", type=float, default=0.05, help="Latência, em segundos, de cada chamada ao serviço de embeddings")
+    parser.add_argument("--taxa-lentas", type=float, default=0.0, help="Proporção de chamadas ao LLM na cauda, 5 vezes mais lentas")
+    parser.add_argument("--taxa-falhas", type=float, default=0.0, help="Proporção de chamadas ao LLM com respostas inválidas")
+    parser.add_argument("--sem-resiliencia", action="store_true", help="Desativa o tempo máximo adaptativo, as duplicatas e as novas tentativas")
+    parser.add_argument("--expansao-unica", action="store_true", help="Expande a consulta em uma única chamada ao LLM")
+    parser.add_argument("--saida", help="Arquivo JSON onde os resultados são gravados")
+    parser.add_argument("--compara", help="Arquivo JSON de uma execução anterior, para comparação")
+    args = parser.parse_args()
+
+    # Isola as medições dos caches persistentes, dos rastros gravados e do limite de chamadas
+    base_professores.USAR_CACHE_EMBEDDINGS = False
+    definidor_banca.USAR_CACHE_LLM = False
+    definidor_banca.LIMITADOR_LLM = None
+    instrumentacao.EXPORTAR_RASTROS = False
+    definidor_banca.USAR_RESILIENCIA = not args.sem_resiliencia
+    chat = ChatSimulado(latencia=args.latencia_llm, taxa_falhas=args.taxa_falhas, taxa_lentas=args.taxa_lentas)
+    registro_modelos.registra_llm(ModelEnum.CHATGPT.value, chat)
+    embeddings = EmbeddingsHash(latencia=args.latencia_embeddings)
+
+    resultados = {"commit": commit_atual(), "parametros": vars(args), "cenarios": {}}
+    diretorio = tempfile.mkdtemp(prefix="benchmark_banca_")
+    try:
+        print(f"Commit {resultados['commit']}, LLM {args.latencia_llm}s, embeddings {args.latencia_embeddings}s")
+        if "ingestao" in args.cenarios:
+            resultados["cenarios"]["ingestao"] = mede_ingestao(diretorio, embeddings, args.repeticoes_ingestao)
+            imprime("ingestao", resultados["cenarios"]["ingestao"], "docs")
+
+        # Os demais cenários usam a base vetorial temporária, criada pela ingestão se ela não tiver sido medida
+        vector_store = base_professores.carrega_databasevetorial(diretorio, embeddings)
+        if "procura" in args.cenarios:
+            resultados["cenarios"]["procura"] = mede_procura(vector_store, sorteia_consultas(100, 42), args.repeticoes)
+            imprime("procura", resultados["cenarios"]["procura"], "buscas")
+        if "combinacao" in args.cenarios:
+            resultados["cenarios"]["combinacao"] = mede_combinacao(args.repeticoes, args.ocorrencias)
+            imprime("combinacao", resultados["cenarios"]["combinacao"], "profs")
+        if "define_banca" in args.cenarios:
+            resultados["cenarios"]["define_banca"] = mede_define_banca(vector_store, args.repeticoes, args.concorrencia, args.expansao_unica)
+            imprime("define_banca", resultados["cenarios"]["define_banca"], "bancas")
+            if definidor_banca.USAR_RESILIENCIA:
+                imprime_resiliencia()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as file:
+            json.dump(resultados, file, ensure_ascii=False, indent=2)
+    if args.compara:
+        with open(args.compara, "r", encoding="utf-8") as file:
+            compara(resultados, json.load(file))
@@ -0,0 +1,148 @@
+'''
+Substitutos determinísticos dos serviços externos, para medir o desempenho da aplicação sem chamar a OpenAI ou o Vertex AI.
+
+- `EmbeddingsHash`: vetoriza os textos espalhando os termos em dimensões escolhidas pelo hash de cada termo;
+  textos com termos em comum têm vetores próximos, de forma que a busca por similaridade continua fazendo sentido.
+- `ChatSimulado`: modelo de chat que responde, após uma latência configurável, objetos válidos de cada schema usado na definição de banca.
+'''
+
+import ast
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+
+from domain.responses_models import ListaPalavrasChave, ListaVariacoesTitulo, ListaTraduzida, ListaRelevanciaProfessores, RelevanciaProfessor, ExpansaoConsulta
+from service.bm25 import tokeniza
+
+# Termos das instruções dos prompts, que não descrevem o trabalho de mestrado
+TERMOS_PROMPT = frozenset(tokeniza("""
+    trabalho mestrado titulo titulos resumo palavras chave areas pesquisa extraia responda perguntas conhecimento curso graduacao
+    proximo tema principais objetivos descrevem geral propoe pesquisar pergunta tenta responder sugira novos destacando algumas
+    combinando diversas formas deiversas variacoes base gere tente use-as expanda consulta original translate following titles
+    keywords english extracted given new professores professor sistema assistente definicao bancas
+"""))
+
+_PROFESSORES = re.compile(r'"id_professor":"([^"]*)", "nome":"([^"]*)"')
+_TITULOS = re.compile(r"titles:\s*(\[.*?\])\s*keywords:", re.DOTALL)
+
+
+class EmbeddingsHash(Embeddings):
+    '''Classe de embeddings determinísticos, com latência configurável por chamada'''
+
+    def __init__(self, dimensoes: int = 256, latencia: float = 0.0):
+        '''
+        Args:
+            dimensoes (int): A quantidade de dimensões dos vetores.
+            latencia (float): O tempo, em segundos, de cada chamada, simulando o serviço de embeddings.
+        '''
+        self.dimensoes = dimensoes
+        self.latencia = latencia
+        self.chamadas = 0
+
+    def vetor(self, texto: str) -> list[float]:
+        '''Soma, para cada termo do texto, um sinal em uma dimensão escolhida pelo hash do termo'''
+        vetor = np.zeros(self.dimensoes, dtype=np.float32)
+        for termo in tokeniza(texto):
+            hash_termo = hashlib.blake2b(termo.encode("utf-8"), digest_size=8).digest()
+            vetor[int.from_bytes(hash_termo[:4], "little") % self.dimensoes] += 1.0 if hash_termo[4] & 1 else -1.0
+        norma = np.linalg.norm(vetor)
+        return (vetor / norma if norma > 0 else vetor).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.chamadas += 1
+        time.sleep(self.latencia)
+        return [self.vetor(texto) for texto in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class ChatSimulado:
+    '''Classe que simula um modelo de chat com saída estruturada, com latência sorteada em torno de um valor médio'''
+
+    def __init__(self, latencia: float = 0.5, variacao: float = 0.2, taxa_falhas: float = 0.0, semente: int = 42, model_name: str = "simulado",
+                 taxa_lentas: float = 0.0, fator_lentidao: float = 5.0):
+        '''
+        Args:
+            latencia (float): A latência média, em segundos, de cada chamada.
+            variacao (float): A variação relativa da latência; cada chamada leva entre latencia * (1 - variacao) e latencia * (1 + variacao).
+            taxa_falhas (float): A proporção de chamadas que falham com ValueError, simulando respostas inválidas.
+            semente (int): A semente do sorteio das latências e das falhas.
+            model_name (str): O nome do modelo, que faz parte da chave do cache de respostas.
+            taxa_lentas (float): A proporção de chamadas que levam `fator_lentidao` vezes a latência sorteada, simulando a cauda da latência.
+            fator_lentidao (float): Quantas vezes mais lentas são as chamadas lentas.
+        '''
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_falhas = taxa_falhas
+        self.model_name = model_name
+        self.taxa_lentas = taxa_lentas
+        self.fator_lentidao = fator_lentidao
+        self._aleatorio = random.Random(semente)
+        self._trava = threading.Lock()
+
+    def with_structured_output(self, schema, include_raw: bool = False, **kwargs) -> "LLMEstruturadoSimulado":
+        return LLMEstruturadoSimulado(self, schema, include_raw)
+
+    def sorteia(self) -> tuple[float, bool]:
+        '''Sorteia a latência, que pode ser da cauda, e se a próxima chamada falha'''
+        with self._trava:
+            latencia = self.latencia * self._aleatorio.uniform(1 - self.variacao, 1 + self.variacao)
+            if self._aleatorio.random() < self.taxa_lentas:
+                latencia *= self.fator_lentidao
+            return latencia, self._aleatorio.random() < self.taxa_falhas
+
+
+class LLMEstruturadoSimulado:
+    '''Classe que responde, para cada schema da definição de banca, um objeto válido montado a partir do prompt'''
+
+    def __init__(self, chat: ChatSimulado, schema, include_raw: bool):
+        self.chat = chat
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def invoke(self, prompt: str, *args, **kwargs):
+        latencia, falha = self.chat.sorteia()
+        time.sleep(latencia)
+        if falha:
+            raise ValueError(f"Resposta simulada inválida para {self.schema.__name__}")
+
+        resposta = self.responde(prompt)
+        if not self.include_raw:
+            return resposta
+        uso = {"input_tokens": len(prompt) // 4, "output_tokens": len(resposta.model_dump_json()) // 4}
+        uso["total_tokens"] = uso["input_tokens"] + uso["output_tokens"]
+        return {"raw": AIMessage(content="", usage_metadata=uso), "parsed": resposta, "parsing_error": None}
+
+    def responde(self, prompt: str):
+        '''Monta a resposta do schema a partir dos termos e dos professores presentes no prompt'''
+        termos = [termo for termo, _ in Counter(t for t in tokeniza(prompt) if t not in TERMOS_PROMPT and len(t) > 3).most_common(8)]
+        palavras_chave = termos[:6] or ["pesquisa"]
+        titulos = [" ".join(palavras_chave[i:] + palavras_chave[:i]) for i in range(5)]
+
+        if self.schema is ListaPalavrasChave:
+            return ListaPalavrasChave(palavras_chave=palavras_chave)
+        if self.schema is ListaVariacoesTitulo:
+            return ListaVariacoesTitulo(titulos=titulos)
+        if self.schema is ListaTraduzida:
+            encontrados = _TITULOS.search(prompt)
+            try:
+                titulos_originais = ast.literal_eval(encontrados.group(1)) if encontrados else titulos
+            except (ValueError, SyntaxError):
+                titulos_originais = titulos
+            return ListaTraduzida(titulos=[f"{titulo} (en)" for titulo in titulos_originais], palavras_chave=[f"{termo} (en)" for termo in palavras_chave])
+        if self.schema is ExpansaoConsulta:
+            return ExpansaoConsulta(palavras_chave=palavras_chave, titulos=titulos, titulos_traduzidos=[f"{titulo} (en)" for titulo in titulos],
+                                    palavras_chave_traduzidas=[f"{termo} (en)" for termo in palavras_chave])
+        if self.schema is ListaRelevanciaProfessores:
+            return ListaRelevanciaProfessores(relevancia_professores=[
+                RelevanciaProfessor(id_professor=id, nome=nome, justificativa=f"{nome} atua em temas relacionados a {', '.join(palavras_chave[:3])}.")
+                for id, nome in _PROFESSORES.findall(prompt)])
+        raise ValueError(f"Schema não simulado: {self.schema.__name__}")
@@ -0,0 +1,47 @@
+'''
+Este módulo define o catálogo de professores, carregado uma única vez em memória e indexado pelo identificador estável de cada professor.
+A base vetorial armazena apenas o identificador e o texto vetorizado; os dados exibidos são obtidos do catálogo.
+'''
+
+import hashlib
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass(slots=True, frozen=True)
+class RegistroProfessor:
+    '''Classe que representa o registro compacto de um professor no catálogo'''
+    id_professor: str
+    nome: str
+    resumo: Optional[str]
+    linhas_pesquisa: tuple[str, ...]
+    foto: Optional[str]
+
+
+class CatalogoProfessores:
+    '''Classe que representa o catálogo de professores indexado pelo identificador estável de cada professor'''
+    __slots__ = ("registros",)
+
+    def __init__(self, registros: dict[str, RegistroProfessor]):
+        self.registros = registros
+
+    def get(self, id_professor: Optional[str]) -> Optional[RegistroProfessor]:
+        '''Retorna o registro do professor com o identificador informado, ou None se ele não estiver no catálogo'''
+        return self.registros.get(id_professor) if id_professor is not None else None
+
+    def __getitem__(self, id_professor: str) -> RegistroProfessor:
+        return self.registros[id_professor]
+
+    def __contains__(self, id_professor: str) -> bool:
+        return id_professor in self.registros
+
+    def __iter__(self) -> Iterator[RegistroProfessor]:
+        return iter(self.registros.values())
+
+    def __len__(self) -> int:
+        return len(self.registros)
+
+
+def id_professor(nome: str) -> str:
+    '''Gera um identificador estável para um professor a partir do seu nome (hash SHA-1 hexadecimal)'''
+    return hashlib.sha1(nome.strip().encode('utf-8')).hexdigest()
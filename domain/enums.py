@@ -5,4 +5,33 @@ class ModelEnum(Enum):
     Enum representando modelos de LLM utilizados no sistema.
     """
     CHATGPT = "ChatGPT"
-    GEMINI = "Gemini"
\ No newline at end of file
+    GEMINI = "Gemini"
+
+class MotorBuscaEnum(Enum):
+    """
+    Enum representando os motores de busca por similaridade disponíveis para a base de professores.
+    """
+    CHROMA = "Chroma"
+    NUMPY = "NumPy"
+    LEXICO = "Léxico (BM25)"
+
+class EtapaEnum(Enum):
+    """
+    Enum representando as etapas da definição de uma banca, informadas no andamento da definição.
+    """
+    EXPANSAO = "expansao"
+    EXTRACAO = "extracao"
+    VARIACAO = "variacao"
+    TRADUCAO = "traducao"
+    BUSCA = "busca"
+    PODA = "poda"
+    RELEVANCIA = "relevancia"
+    CONCLUSAO = "conclusao"
+
+class MetodoPodaEnum(Enum):
+    """
+    Enum representando as formas de pontuar os candidatos na poda feita antes da checagem de relevância.
+    """
+    RRF = "RRF"
+    MEDIA = "Média"
+    NENHUMA = "Nenhuma"
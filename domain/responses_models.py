@@ -5,9 +5,15 @@ Estes modelos são utilizados para serializar e desserializar dados entre difere
 
 import ast
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from langchain.docstore.document import Document
 
+from domain.catalogo import CatalogoProfessores, RegistroProfessor, id_professor
+from domain.enums import MetodoPodaEnum
+from domain.texto import normaliza_texto
+
+# Constante da fusão por posição recíproca (Reciprocal Rank Fusion) das pesquisas em que o professor foi encontrado
+K_RRF = 60
 
 class ListaPalavrasChave(BaseModel):
     '''Classe que representa a lista de palavras-chave de um trabalho de mestrado'''
@@ -26,30 +32,75 @@ class ListaTraduzida(BaseModel):
     palavras_chave: List[str] = Field(..., title="List of keywords in English", 
                                       description="List of keywords and research areas that describe the theme of the master's thesis in English")
 
+class ExpansaoConsulta(BaseModel):
+    '''Classe que representa, em uma única resposta, as palavras-chave, as variações de título e as traduções de um trabalho de mestrado'''
+    palavras_chave: List[str] = Field(..., title="Lista de palavras-chave e áreas de pesquisa do trabalho de mestrado", 
+                                      description="Lista de palavras-chave e áreas de pesquisa que descrevem o tema do trabalho de mestrado")
+    titulos: List[str] = Field(..., title="Lista de titulos", 
+                                      description="Possíveis novos títulos para um trabalho de mestrado")
+    titulos_traduzidos: List[str] = Field(..., title="List of titles in English", 
+                                      description="The original title and the possible new titles for the master's thesis in English")
+    palavras_chave_traduzidas: List[str] = Field(..., title="List of keywords in English", 
+                                      description="List of keywords and research areas that describe the theme of the master's thesis in English")
+
+    def separa_etapas(self) -> tuple[ListaPalavrasChave, ListaVariacoesTitulo, ListaTraduzida]:
+        '''Separa a expansão nas respostas equivalentes às três etapas de extração, variação de título e tradução'''
+        return (ListaPalavrasChave(palavras_chave=list(self.palavras_chave)),
+                ListaVariacoesTitulo(titulos=list(self.titulos)),
+                ListaTraduzida(titulos=list(self.titulos_traduzidos), palavras_chave=list(self.palavras_chave_traduzidas)))
+
 class Professor(BaseModel):
     '''Classe que representa um professor'''
     nome: Optional[str] = Field(default=None, title="Nome do professor", description="Nome do professor")
-    #uuid: Optional[str] = Field(default=None, title="UUID do professor", description="UUID do professor")
+    id_professor: Optional[str] = Field(default=None, title="Identificador do professor", description="Identificador do professor no catálogo")
     resumo: Optional[str] = Field(default=None, title="Resumo do professor", description="Resumo do professor")
     linhas_pesquisa: Optional[List[str]] = Field(default=None, title="Área de atuação do professor", description="Área de atuação do professor")
     foto: Optional[str] = Field(default=None, title="Foto do professor", description="Foto do professor")
-    lista_similaridade: Optional[List[float]] = Field(default=[], title="Similaridades do professor com o tema do trabalho de mestrado", 
-                                description="Similaridades do professor com o tema do trabalho de mestrado")
+    soma_similaridade: float = Field(default=0.0, title="Soma das similaridades do professor com o tema do trabalho de mestrado", 
+                                description="Soma das similaridades do professor em todas as pesquisas em que foi encontrado")
+    similaridade_maxima: float = Field(default=0.0, title="Maior similaridade do professor com o tema do trabalho de mestrado", 
+                                description="Maior similaridade do professor entre as pesquisas em que foi encontrado")
+    melhor_posicao: Optional[int] = Field(default=None, title="Melhor posição do professor", description="Melhor posição do professor entre os resultados das pesquisas, a partir de 1")
+    soma_rrf: float = Field(default=0.0, title="Soma das posições recíprocas do professor", 
+                                description="Soma de 1 / (K_RRF + posição) em todas as pesquisas em que o professor foi encontrado")
     pontuacao: Optional[int] = Field(default = 0, title="Pontuação do professor", description="Em quantas pesquisas o professor foi encontrado")
+    pontuacao_lexica: int = Field(default=0, title="Pontuação léxica do professor", 
+                                description="Em quantas pesquisas da busca léxica da busca híbrida o professor foi encontrado, incluídas na pontuação")
     justificativa_relevancia: Optional[str] = Field(default=None, title="Justificativa", description="Justificativa da relevância ou falta de relevancia do professor para o trabalho de mestrado")
     
-    def from_tuple_json_similarity(data: tuple[Document, float]):
+    def from_tuple_json_similarity(data: tuple[Document, float], posicao: Optional[int] = None, lexica: bool = False):
         '''Converte um dicionário em um objeto Professor'''
         try:
             dict = ast.literal_eval(data[0].page_content)
             prof = Professor(**dict)
-            prof.lista_similaridade.append(data[1])
+            prof.id_professor = prof.id_professor or id_professor(prof.nome)
+            prof.registra_ocorrencia(data[1], posicao, lexica)
             return prof
         except Exception as e:
             print(f"Erro ao deserializar professor da base: {e}")
             print(f"Dado do professor: {data[0].page_content}")
             return Professor()
     
+    def from_tuple_catalogo(data: tuple[Document, float], catalogo: CatalogoProfessores, posicao: Optional[int] = None,
+                            lexica: bool = False) -> Optional["Professor"]:
+        '''Converte um resultado da busca em um objeto Professor a partir do catálogo, pelo identificador do professor.
+        Retorna None se o identificador não estiver no catálogo, ex.: em uma base vetorial desatualizada'''
+        id = data[0].metadata.get("id_professor")
+        if not id:
+            # Bases vetoriais antigas, sem o identificador, armazenam o dicionário do professor no conteúdo do documento
+            return Professor.from_tuple_json_similarity(data, posicao, lexica)
+        registro = catalogo.get(id)
+        if registro is None:
+            return None
+        prof = Professor.from_registro(registro)
+        prof.registra_ocorrencia(data[1], posicao, lexica)
+        return prof
+
+    def from_registro(registro: RegistroProfessor):
+        '''Converte um registro do catálogo em um objeto Professor'''
+        return Professor(nome=registro.nome, id_professor=registro.id_professor, resumo=registro.resumo,
+                         linhas_pesquisa=list(registro.linhas_pesquisa), foto=registro.foto)
+    
     def from_Document(doc: Document):
         '''Converte um Document em um objeto Professor'''
         try:
@@ -60,26 +111,80 @@ class Professor(BaseModel):
             print(f"Erro ao deserializar professor de JSON: {e}")
             print(f"Dado do professor: {doc.page_content}")
             return Professor()
+
+    def chave(self) -> str:
+        '''Retorna a chave que identifica o professor: o identificador do catálogo ou, na falta dele, o nome normalizado'''
+        return self.id_professor or normaliza_texto(self.nome or "")
+
+    def registra_ocorrencia(self, similaridade: float, posicao: Optional[int] = None, lexica: bool = False):
+        '''Registra que o professor foi encontrado em mais uma pesquisa, com a similaridade e a posição informadas.
+        As ocorrências da busca léxica da busca híbrida (lexica) contam apenas na pontuação e nas posições, sem alterar a similaridade'''
+        self.pontuacao += 1
+        if lexica:
+            self.pontuacao_lexica += 1
+        else:
+            self.soma_similaridade += similaridade
+            self.similaridade_maxima = max(self.similaridade_maxima, similaridade)
+        if posicao is not None:
+            self.soma_rrf += 1 / (K_RRF + posicao)
+            if self.melhor_posicao is None or posicao < self.melhor_posicao:
+                self.melhor_posicao = posicao
+
+    def combina(self, professor: "Professor"):
+        '''Acumula as ocorrências de outro objeto do mesmo professor'''
+        self.pontuacao += professor.pontuacao
+        self.pontuacao_lexica += professor.pontuacao_lexica
+        self.soma_similaridade += professor.soma_similaridade
+        self.similaridade_maxima = max(self.similaridade_maxima, professor.similaridade_maxima)
+        self.soma_rrf += professor.soma_rrf
+        if professor.melhor_posicao is not None and (self.melhor_posicao is None or professor.melhor_posicao < self.melhor_posicao):
+            self.melhor_posicao = professor.melhor_posicao
+
+    def similaridade_media(self) -> float:
+        '''Retorna a similaridade média do professor nas pesquisas, exceto as léxicas da busca híbrida, em que foi encontrado'''
+        ocorrencias = self.pontuacao - self.pontuacao_lexica
+        return self.soma_similaridade / ocorrencias if ocorrencias else 0.0
+
+    def pontuacao_poda(self, metodo: str, total_pesquisas: int, total_pesquisas_lexicas: int = 0) -> float:
+        '''Retorna a pontuação do professor, entre 0 e 1, usada na poda dos candidatos: a fusão das posições recíprocas (RRF)
+        de todas as pesquisas, ou a similaridade média nas pesquisas exceto as léxicas da busca híbrida,
+        contando como zero as pesquisas em que ele não foi encontrado'''
+        if not total_pesquisas:
+            return 0.0
+        if metodo == MetodoPodaEnum.RRF.value:
+            # Normaliza pela pontuação de quem fica em primeiro lugar em todas as pesquisas
+            return self.soma_rrf * (K_RRF + 1) / total_pesquisas
+        pesquisas = total_pesquisas - total_pesquisas_lexicas
+        return self.soma_similaridade / pesquisas if pesquisas else 0.0
         
 
 class ListaProfessores(BaseModel):
     '''Classe que representa a lista de professores que podem avaliar um trabalho de mestrado'''
     professores: List[Professor] = Field(..., title="Lista de professores",
                                       description="Lista de professores que podem avaliar um trabalho de mestrado")
+    total_pesquisas: int = Field(default=0, title="Total de pesquisas", description="Quantidade de pesquisas feitas para encontrar os professores da lista")
+    total_pesquisas_lexicas: int = Field(default=0, title="Total de pesquisas léxicas",
+                                      description="Quantidade de pesquisas da busca léxica da busca híbrida, incluídas no total de pesquisas")
+    # Índice dos professores da lista pela chave de cada professor
+    _indice: dict[str, Professor] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        for professor in self.professores:
+            self._indice.setdefault(professor.chave(), professor)
+
+    def busca(self, chave: Optional[str]) -> Optional[Professor]:
+        '''Retorna o professor da lista com a chave informada, ou None se ele não estiver na lista'''
+        return self._indice.get(chave) if chave is not None else None
     
     def add_professor(self, professor: Professor):
-        '''Adiciona um professor à lista de professores'''
-        # checa se professor já existe na lista a partir do nome
-        for p in self.professores:
-            if p.nome == professor.nome:
-                # aumenta pontuação
-                p.pontuacao += 1
-                # atualiza similaridade média
-                p.lista_similaridade.extend(professor.lista_similaridade)
-                return
+        '''Adiciona um professor à lista de professores, acumulando as ocorrências se ele já estiver na lista'''
+        # checa se professor já existe na lista a partir da chave
+        existente = self._indice.get(professor.chave())
+        if existente is not None:
+            existente.combina(professor)
+            return
         
-        professor.pontuacao = 1
-        professor.lista_similaridade = professor.lista_similaridade
+        self._indice[professor.chave()] = professor
         self.professores.append(professor)
     
     def add_professores(self, professores: List[Professor]):
@@ -87,6 +192,22 @@ class ListaProfessores(BaseModel):
         for professor in professores:
             self.add_professor(professor)
     
+    def poda(self, metodo: str, max_professores: int, pontuacao_minima: float = 0.0, min_professores: int = 0) -> List[Professor]:
+        '''Mantém na lista apenas os max_professores com maior pontuação de poda que atingem a pontuação mínima,
+        preservando ao menos min_professores, e retorna os professores removidos'''
+        if metodo == MetodoPodaEnum.NENHUMA.value:
+            return []
+        ranking = sorted(self.professores, key=lambda p: (p.pontuacao_poda(metodo, self.total_pesquisas, self.total_pesquisas_lexicas), p.pontuacao), reverse=True)
+        mantidos = [professor for professor in ranking[:max_professores] if professor.pontuacao_poda(metodo, self.total_pesquisas, self.total_pesquisas_lexicas) >= pontuacao_minima]
+        if len(mantidos) < min_professores:
+            mantidos = ranking[:min(min_professores, max_professores)]
+
+        chaves_mantidas = {professor.chave() for professor in mantidos}
+        removidos = [professor for professor in self.professores if professor.chave() not in chaves_mantidas]
+        self.professores = [professor for professor in self.professores if professor.chave() in chaves_mantidas]
+        self._indice = {professor.chave(): professor for professor in self.professores}
+        return removidos
+
     def ordena_por_relevancia(self):
         '''Ordena a lista de professores por relevância'''
         self.professores.sort(key=lambda x: x.pontuacao, reverse=True)
@@ -96,13 +217,19 @@ class RelevanciaProfessor(BaseModel):
     '''Classe que representa a justificativa da relevância do professor para um trabalho de mestrado'''
     justificativa: str = Field(..., title="Justificativa", description="Justificativa da relevância ou falta de relevancia do professor para o trabalho de mestrado")
     nome: Optional[str] = Field(default=None, title="Nome", description="Professor que avalia o trabalho de mestrado")
-    #uuid: Optional[str] = Field(default=None, title="UUID", description="UUID do professor que avalia o trabalho de mestrado")
+    id_professor: Optional[str] = Field(default=None, title="Identificador", description="Identificador do professor que avalia o trabalho de mestrado, exatamente como informado")
 
 class ListaRelevanciaProfessores(BaseModel):
     '''Classe que representa a lista de relevância dos professores para um trabalho de mestrado'''
     relevancia_professores: Optional[List[RelevanciaProfessor]] = Field(default=[], title="Lista de relevância dos professores",
                                                                 description="Lista de relevância dos professores para um trabalho de mestrado")
     
-    def add_relevancias(self, relevancia_professores: List[RelevanciaProfessor]):
-        '''Adiciona uma lista de relevância dos professores à lista de relevância dos professores'''
-        self.relevancia_professores.extend(relevancia_professores)
\ No newline at end of file
+    def por_chave(self) -> dict[str, RelevanciaProfessor]:
+        '''Indexa as relevâncias pelo identificador do professor e pelo nome normalizado'''
+        indice = {}
+        for relevancia in self.relevancia_professores:
+            if relevancia.nome:
+                indice.setdefault(normaliza_texto(relevancia.nome), relevancia)
+            if relevancia.id_professor:
+                indice.setdefault(relevancia.id_professor, relevancia)
+        return indice
\ No newline at end of file
@@ -0,0 +1,11 @@
+'''
+Este módulo define funções auxiliares para normalização de textos, usadas na comparação de nomes e termos.
+'''
+
+import unicodedata
+
+
+def normaliza_texto(texto: str) -> str:
+    '''Remove acentos, converte para minúsculas e colapsa espaços, para comparar textos que podem variar na escrita'''
+    sem_acentos = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
@@ -1,11 +1,15 @@
 """
 Este script configura uma aplicação web Streamlit para auxiliar na definição de bancas com base no sistema Lattes.
 """
-from service import definidor_banca, base_professores
-from domain.enums import ModelEnum
-from statistics import mean
+import os
+from service import definidor_banca, base_professores, instrumentacao, registro_modelos
+from domain.enums import EtapaEnum, MetodoPodaEnum, ModelEnum, MotorBuscaEnum
+from service.cache import EmbeddingsComCache
 import streamlit as st
 
+# Carrega as variáveis do .env antes de qualquer leitura do ambiente, mesmo que nenhum modelo seja criado nesta execução
+registro_modelos.carrega_ambiente()
+
 # Define o título da página e configurações iniciais do Streamlit
 page_title = "Auxiliar para a Definição de Bancas com base em Sistema Lattes"
 st.set_page_config(page_title=page_title)
@@ -13,9 +17,25 @@ st.title(page_title)
 
 # Cria uma seleção na barra lateral para escolher o modelo de LLM
 llm_model = st.sidebar.selectbox("Escolha o modelo de LLM", [m.value for m in ModelEnum])
+# Permite extrair palavras-chave, variar e traduzir o título em uma única chamada ao LLM
+expansao_unica = st.sidebar.checkbox("Expandir consulta em uma única chamada ao LLM")
+
+# Cria uma seleção na barra lateral para escolher o motor de busca por similaridade
+motor_busca = st.sidebar.selectbox("Escolha o motor de busca", [m.value for m in MotorBuscaEnum])
+# Permite somar à busca vetorial os resultados do índice léxico BM25
+busca_hibrida = st.sidebar.checkbox("Busca híbrida (vetorial e léxica)", value=definidor_banca.BUSCA_HIBRIDA,
+                                    disabled=motor_busca == MotorBuscaEnum.LEXICO.value)
+
+# Cria uma seleção na barra lateral para configurar a poda dos candidatos antes da checagem de relevância
+metodo_poda = st.sidebar.selectbox("Poda dos candidatos", [m.value for m in MetodoPodaEnum])
+max_candidatos = st.sidebar.slider("Máximo de candidatos enviados ao LLM", 5, 50, definidor_banca.MAX_CANDIDATOS_RELEVANCIA, step=5)
 
 # Carrega os professores com base no modelo selecionado
-vector_store = base_professores.carrega_professores(llm_model)
+vector_store = base_professores.carrega_professores(llm_model, motor_busca=motor_busca)
+
+# Expõe as métricas do processo no formato do Prometheus, se a porta estiver configurada no .env
+if os.getenv("PORTA_METRICAS"):
+    instrumentacao.inicia_servidor_metricas(int(os.getenv("PORTA_METRICAS")))
 
 # Cria campos de entrada para o título do trabalho, resumo e palavras-chave
 st.text_input("Qual o título do seu trabalho de mestrado?", key="master_title")
@@ -27,23 +47,68 @@ left, middle, right = st.columns(3)
 
 # Define a ação do botão "Enviar"
 if middle.button("Enviar", use_container_width=True):
-    # Chama a função para definir a banca com os dados fornecidos
-    response = definidor_banca.define_banca(
-        st.session_state.master_title,
-        st.session_state.master_summary,
-        st.session_state.master_keywords,
-        llm_model,
-        vector_store)
-    
-    #ordenando a lista de professores por pontuação
-    response.sort(key=lambda p: p.pontuacao, reverse=True)
-    st.subheader("Possíveis professores para a banca")
-    st.header(st.session_state.master_title)
-    
-    # Exibe os professores que podem compor a banca
-    for professor in response:
-        left, middle = st.container(border=True).columns((3, 6))
-        left.image(professor.foto, caption=professor.nome)
-        middle.subheader(professor.nome)
-        middle.write(professor.justificativa_relevancia)
-        middle.metric(f"Relevância: ", round(mean(professor.lista_similaridade) * 100, 2))
+    status = st.status("Definindo banca", expanded=True)
+
+    # Exibe o andamento de cada etapa da definição da banca
+    def exibe_progresso(etapa, mensagem, dados=None):
+        status.write(mensagem)
+        if dados is not None:
+            status.write(dados)
+
+    # Chama a função para definir a banca com os dados fornecidos, exibindo os professores à medida que ficam prontos
+    justificativas = {}
+    with instrumentacao.rastreia("define_banca", modelo=llm_model, expansao_unica=expansao_unica) as rastro:
+        for etapa, professores in definidor_banca.define_banca_incremental(
+                st.session_state.master_title,
+                st.session_state.master_summary,
+                st.session_state.master_keywords,
+                llm_model,
+                vector_store,
+                expansao_unica,
+                progresso=exibe_progresso,
+                metodo_poda=metodo_poda,
+                max_candidatos=max_candidatos,
+                busca_hibrida=busca_hibrida):
+            match etapa:
+                case EtapaEnum.BUSCA:
+                    # Exibe os candidatos, ordenados por pontuação, assim que a busca termina
+                    st.subheader("Possíveis professores para a banca")
+                    st.header(st.session_state.master_title)
+                    for professor in professores:
+                        left, middle = st.container(border=True).columns((3, 6))
+                        left.image(professor.foto, caption=professor.nome)
+                        middle.subheader(professor.nome)
+                        justificativas[professor.chave()] = middle.empty()
+                        justificativas[professor.chave()].caption("Checando relevância...")
+                        middle.metric(f"Relevância: ", round(professor.similaridade_media() * 100, 2))
+                case EtapaEnum.RELEVANCIA:
+                    # Preenche as justificativas de cada lote assim que ele termina
+                    for professor in professores:
+                        justificativas[professor.chave()].write(professor.justificativa_relevancia or "Relevância não verificada.")
+                case EtapaEnum.CONCLUSAO:
+                    status.update(label="Banca definida", state="complete", expanded=False)
+
+    # Guarda o resumo do rastro para exibi-lo na barra lateral
+    st.session_state.resumo_rastro = rastro.resumo()
+
+
+# Exibe os contadores do cache de respostas dos LLMs
+if definidor_banca.USAR_CACHE_LLM:
+    estatisticas_cache = definidor_banca.obtem_cache_llm().estatisticas()
+    st.sidebar.caption(f"Cache de LLM: {estatisticas_cache['acertos']} acertos, {estatisticas_cache['falhas']} falhas, "
+                       f"{estatisticas_cache['entradas']} respostas guardadas")
+
+# Exibe os contadores do cache de embeddings
+if isinstance(getattr(vector_store, "embeddings", None), EmbeddingsComCache):
+    estatisticas_embeddings = vector_store.embeddings.estatisticas()
+    st.sidebar.caption(f"Cache de embeddings: {estatisticas_embeddings['acertos_memoria']} acertos em memória, "
+                       f"{estatisticas_embeddings['acertos_disco']} em disco, {estatisticas_embeddings['falhas']} textos vetorizados")
+
+# Exibe o resumo do rastro da última definição de banca
+if "resumo_rastro" in st.session_state:
+    resumo_rastro = st.session_state.resumo_rastro
+    contadores = resumo_rastro["contadores"]
+    st.sidebar.caption(f"Última definição: {resumo_rastro['duracao']:.1f}s, {contadores.get('chamadas_llm', 0):g} chamadas ao LLM, "
+                       f"{contadores.get('tokens_prompt', 0):g} tokens de prompt e {contadores.get('tokens_resposta', 0):g} de resposta")
+    st.sidebar.caption(" | ".join(f"{etapa.value}: {resumo_rastro['trechos'][etapa.value]:.1f}s"
+                                  for etapa in EtapaEnum if etapa.value in resumo_rastro["trechos"]))
@@ -1,99 +1,601 @@
+import hashlib
 import json
 import os
+import threading
+import time
+import numpy as np
 import streamlit as st
-from uuid import uuid4
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from langchain.docstore.document import Document
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_google_vertexai import VertexAIEmbeddings
 from langchain_chroma import Chroma
 
-from domain.enums import ModelEnum
+from domain.catalogo import CatalogoProfessores, RegistroProfessor, id_professor
+from domain.enums import ModelEnum, MotorBuscaEnum
 from domain.responses_models import Professor
+from service import instrumentacao, registro_modelos, sinteses, snapshot
+from service.bm25 import IndiceBM25
+from service.busca_numpy import BuscaNumpy
+from service.cache import CacheSQLite, EmbeddingsComCache
 
-def carrega_professores(llm_model: str):
+# Quantidade de professores enviados em cada chamada ao serviço de embeddings
+TAMANHO_LOTE_EMBEDDINGS = 64
+# Número máximo de chamadas simultâneas ao serviço de embeddings
+MAX_REQUISICOES_EMBEDDINGS = 4
+# Arquivo, dentro do diretório de persistência, que registra os professores já gravados
+ARQUIVO_CHECKPOINT = "checkpoint_ingestao.json"
+# Versão do formato do texto vetorizado (texto_embedding); faz parte do hash de conteúdo de cada professor
+VERSAO_TEXTO_EMBEDDING = 1
+
+# Catálogos já carregados, por caminho do arquivo JSON, com a data de modificação do arquivo
+_catalogos: dict[str, tuple[int, CatalogoProfessores]] = {}
+_indices_bm25: dict[str, tuple[int, IndiceBM25]] = {}
+
+# Cache dos embeddings em memória e em disco; desativado se USAR_CACHE_EMBEDDINGS for falso
+USAR_CACHE_EMBEDDINGS = True
+CAMINHO_CACHE_EMBEDDINGS = "data/cache/embeddings.sqlite3"
+MAX_ENTRADAS_CACHE_EMBEDDINGS = 20000
+MAX_MEMORIA_CACHE_EMBEDDINGS = 4096
+
+_cache_embeddings: CacheSQLite | None = None
+
+# Snapshot binário do catálogo e dos embeddings, gerado com: python -m service.base_professores --snapshot
+CAMINHO_SNAPSHOT = "data/snapshot/professores.snap"
+# Snapshots já abertos, por caminho, com as datas de modificação do snapshot e do arquivo JSON
+_snapshots: dict[str, tuple[tuple[int, int], snapshot.Snapshot | None]] = {}
+
+# Sínteses dos professores enviadas ao LLM na checagem de relevância, geradas fora da aplicação
+CAMINHO_SINTESES = "data/sinteses_professores.json"
+MAX_TOKENS_SINTESE = 160
+_sinteses: dict[str, tuple[int, dict[str, dict]]] = {}
+
+# Bases já abertas no processo, por modelo de embeddings e motor de busca, com a data de modificação do arquivo JSON;
+# compartilhadas entre as execuções do Streamlit e entre as sessões
+_bases: dict[tuple[str, str], tuple[int, object]] = {}
+_trava_bases = threading.Lock()
+
+def carrega_professores(llm_model: str, sincronizar: bool = False, motor_busca: str = MotorBuscaEnum.CHROMA.value):
     """
     Carrega os dados dos professores com base no modelo de linguagem especificado.
     Args:
         llm_model (str): O modelo de linguagem a ser utilizado.
+        sincronizar (bool): Se verdadeiro, sincroniza a base de dados vetorial com o arquivo JSON antes de retorná-la.
+        motor_busca (str): O motor de busca por similaridade (MotorBuscaEnum) usado nas consultas.
     Returns:
-        O resultado da função carrega_databasevetorial, que carrega a base de dados vetorial com o diretório e embeddings especificados.
+        O resultado da função carrega_databasevetorial, que carrega a base de dados vetorial com o diretório e embeddings especificados,
+        ou a busca em memória quando o motor de busca for o NumPy. A busca em memória é aberta a partir do snapshot,
+        se houver um snapshot válido para o modelo, ou construída a partir da base de dados vetorial.
+        Com o motor de busca léxico, retorna o índice BM25, sem nenhum acesso ao serviço de embeddings.
+        A base é aberta uma única vez por processo para cada modelo e motor de busca, e reutilizada nas chamadas seguintes.
     """
-    load_dotenv()
+    if motor_busca == MotorBuscaEnum.LEXICO.value and not sincronizar:
+        return carrega_indice_bm25()
+
     if llm_model not in [ModelEnum.CHATGPT.value]:
         llm_model = "Vertex"
+    if sincronizar:
+        return abre_base_professores(llm_model, sincronizar, motor_busca)
 
+    # A base é reaberta apenas se o arquivo JSON tiver sido modificado desde a abertura anterior
+    chave = (llm_model, motor_busca)
+    caminho_documento = './data/json_curriculos.json'
+    modificacao = os.stat(caminho_documento).st_mtime_ns if os.path.exists(caminho_documento) else 0
+    with _trava_bases:
+        if chave not in _bases or _bases[chave][0] != modificacao:
+            _bases[chave] = (modificacao, abre_base_professores(llm_model, sincronizar, motor_busca))
+        return _bases[chave][1]
+
+def abre_base_professores(llm_model: str, sincronizar: bool, motor_busca: str):
+    """
+    Abre a base de dados vetorial, ou a busca em memória, com o cliente de embeddings compartilhado do modelo.
+    Args:
+        llm_model (str): O modelo de embeddings: ModelEnum.CHATGPT ou "Vertex".
+        sincronizar (bool): Se verdadeiro, sincroniza a base de dados vetorial com o arquivo JSON.
+        motor_busca (str): O motor de busca por similaridade (MotorBuscaEnum) usado nas consultas.
+    Returns:
+        Chroma | BuscaNumpy: A base aberta.
+    """
     persist_directory = f"data/vectorstore/{llm_model}"
 
-    match llm_model:
-        case ModelEnum.CHATGPT.value:
-            embeddings = OpenAIEmbeddings()
-        case "Vertex":
-            embeddings = VertexAIEmbeddings(model="text-embedding-004")
+    embeddings = registro_modelos.obtem_embeddings(llm_model)
+    if USAR_CACHE_EMBEDDINGS:
+        embeddings = envolve_cache_embeddings(embeddings)
         
-    return carrega_databasevetorial(persist_directory, embeddings)
+    if motor_busca == MotorBuscaEnum.NUMPY.value and not sincronizar:
+        snap = carrega_snapshot()
+        if snap is not None and llm_model in snap.modelos():
+            return BuscaNumpy(embeddings, snap.matriz(llm_model), [""] * len(snap.ids),
+                              [{"id_professor": id} for id in snap.ids], snap.espaco(llm_model), normalizada=True, ids=list(snap.ids))
+
+    vectordb = carrega_databasevetorial(persist_directory, embeddings, sincronizar)
+    if motor_busca == MotorBuscaEnum.NUMPY.value:
+        return BuscaNumpy.from_chroma(vectordb)
+    return vectordb
 
-def carrega_databasevetorial(persist_directory, embeddings):
+def carrega_databasevetorial(persist_directory, embeddings, sincronizar: bool = False):
     """
     Carrega ou popula um banco de dados vetorial.
 
     Esta função verifica se o diretório de persistência existe e não está vazio.
-    Se o diretório existir e contiver arquivos, carrega o banco de dados vetorial a partir do diretório.
-    Caso contrário, popula o banco de dados vetorial.
+    Se o diretório existir e contiver arquivos, carrega o banco de dados vetorial a partir do diretório,
+    sincronizando-o com o arquivo JSON quando `sincronizar` for verdadeiro.
+    Caso contrário, ou se houver o checkpoint de uma ingestão interrompida, popula o banco de dados vetorial.
 
     Args:
         persist_directory (str): O caminho do diretório onde o banco de dados vetorial é persistido.
         embeddings (function): A função de embeddings utilizada para criar ou carregar o banco de dados vetorial.
+        sincronizar (bool): Se verdadeiro, atualiza somente os professores alterados no arquivo JSON e remove os ausentes.
 
     Returns:
         Chroma: Uma instância do banco de dados vetorial carregado ou populado.
     """
-    if os.path.exists(persist_directory) and os.listdir(persist_directory):
-        vectordb = Chroma(collection_name="professores", persist_directory= persist_directory, embedding_function = embeddings)
+    ingestao_incompleta = os.path.exists(os.path.join(persist_directory, ARQUIVO_CHECKPOINT))
+    if os.path.exists(persist_directory) and os.listdir(persist_directory) and not ingestao_incompleta:
+        if sincronizar:
+            vectordb = sincroniza_databasevetorial(persist_directory, embeddings)
+        else:
+            vectordb = Chroma(collection_name="professores", persist_directory= persist_directory, embedding_function = embeddings)
     else:
         vectordb = popula_databasevetorial(persist_directory, embeddings)
     return vectordb
 
-def popula_databasevetorial(persist_directory, embeddings):
+def popula_databasevetorial(persist_directory, embeddings, tamanho_lote: int = TAMANHO_LOTE_EMBEDDINGS, max_requisicoes: int = MAX_REQUISICOES_EMBEDDINGS):
     """
     Popula a base de dados vetorial com documentos de professores.
+
+    Os professores já gravados são registrados em um checkpoint no diretório de persistência,
+    de forma que uma ingestão interrompida continue de onde parou.
     Args:
         persist_directory (str): O diretório onde a base de dados vetorial será persistida.
         embeddings (function): A função de embeddings a ser utilizada para a vetorização dos documentos.
+        tamanho_lote (int): Quantidade de documentos vetorizados em cada chamada ao serviço de embeddings.
+        max_requisicoes (int): Número máximo de chamadas simultâneas ao serviço de embeddings.
     Returns:
         Chroma: A instância da base de dados vetorial preenchida com os documentos dos professores.
     """
     prog_bar = st.progress(0, "Carregando dados de professores...")
+    vectordb = Chroma(collection_name="professores", persist_directory= persist_directory, embedding_function = embeddings)
     try:
         professores_documentos = carrega_JSON()
-        vectordb = Chroma(collection_name="professores", persist_directory= persist_directory, embedding_function = embeddings)
-        
-        for i, doc in enumerate(professores_documentos):
-            try:
-                vectordb.add_documents([doc], id=str(uuid4()))
-            except:
-                print(f"Erro ao adicionar professor: {Professor.from_Document(doc).nome} \n {e}")
-            prog_bar.progress(i/len(professores_documentos))
-        prog_bar.progress(1.0).balloons()
+
+        # Descarta os professores já gravados por uma ingestão anterior interrompida
+        checkpoint = carrega_checkpoint(persist_directory)
+        concluidos = set(checkpoint["ids_concluidos"])
+        pendentes = [doc for doc in professores_documentos if doc.metadata["id_professor"] not in concluidos]
+        salva_checkpoint(persist_directory, checkpoint)
+
+        def registra_lote(ids_lote: list[str]):
+            checkpoint["ids_concluidos"].extend(ids_lote)
+            salva_checkpoint(persist_directory, checkpoint)
+
+        ingere_documentos(vectordb, embeddings, pendentes, tamanho_lote, max_requisicoes, registra_lote, prog_bar)
+
+        if len(checkpoint["ids_concluidos"]) == len(professores_documentos):
+            os.remove(os.path.join(persist_directory, ARQUIVO_CHECKPOINT))
+            prog_bar.progress(1.0).balloons()
+
+    except Exception as e:
+        print(e)
+
+    return vectordb
+
+def sincroniza_databasevetorial(persist_directory, embeddings, tamanho_lote: int = TAMANHO_LOTE_EMBEDDINGS, max_requisicoes: int = MAX_REQUISICOES_EMBEDDINGS):
+    """
+    Sincroniza a base de dados vetorial com o arquivo JSON de professores.
+
+    Compara o hash do conteúdo de cada professor no JSON com o hash gravado nos metadados da base,
+    vetoriza novamente apenas os professores novos ou alterados e remove da base os professores que não estão mais no JSON.
+    Args:
+        persist_directory (str): O diretório onde a base de dados vetorial é persistida.
+        embeddings (function): A função de embeddings a ser utilizada para a vetorização dos documentos.
+        tamanho_lote (int): Quantidade de documentos vetorizados em cada chamada ao serviço de embeddings.
+        max_requisicoes (int): Número máximo de chamadas simultâneas ao serviço de embeddings.
+    Returns:
+        Chroma: A instância da base de dados vetorial sincronizada.
+    """
+    prog_bar = st.progress(0, "Sincronizando dados de professores...")
+    vectordb = Chroma(collection_name="professores", persist_directory= persist_directory, embedding_function = embeddings)
+    try:
+        professores_documentos = carrega_JSON()
+        existentes = vectordb.get(include=["metadatas"])
+        hashes_existentes = {id: (metadados or {}).get("hash_conteudo") for id, metadados in zip(existentes["ids"], existentes["metadatas"])}
+
+        alterados = [doc for doc in professores_documentos if hashes_existentes.get(doc.metadata["id_professor"]) != doc.metadata["hash_conteudo"]]
+        ids_json = {doc.metadata["id_professor"] for doc in professores_documentos}
+        removidos = [id for id in hashes_existentes if id not in ids_json]
+
+        if removidos:
+            vectordb.delete(ids=removidos)
+        ingere_documentos(vectordb, embeddings, alterados, tamanho_lote, max_requisicoes, prog_bar=prog_bar)
+        print(f"Sincronização: {len(alterados)} professores atualizados, {len(removidos)} removidos, "
+              f"{len(professores_documentos) - len(alterados)} inalterados")
+        prog_bar.progress(1.0)
 
     except Exception as e:
         print(e)
 
     return vectordb
+
+def ingere_documentos(vectordb: Chroma, embeddings, documentos: list[Document], tamanho_lote: int = TAMANHO_LOTE_EMBEDDINGS,
+                      max_requisicoes: int = MAX_REQUISICOES_EMBEDDINGS, ao_gravar_lote = None, prog_bar = None) -> int:
+    """
+    Vetoriza e grava documentos de professores na base de dados vetorial.
+
+    Os documentos são vetorizados em lotes de `tamanho_lote`, com no máximo `max_requisicoes` chamadas simultâneas
+    ao serviço de embeddings, e cada lote é gravado de uma só vez no Chroma com o identificador estável do professor,
+    de forma que gravar novamente um professor substitui o registro anterior.
+    Args:
+        vectordb (Chroma): A base de dados vetorial de destino.
+        embeddings (function): A função de embeddings a ser utilizada para a vetorização dos documentos.
+        documentos (list[Document]): Os documentos de professores gerados por `carrega_JSON`.
+        tamanho_lote (int): Quantidade de documentos vetorizados em cada chamada ao serviço de embeddings.
+        max_requisicoes (int): Número máximo de chamadas simultâneas ao serviço de embeddings.
+        ao_gravar_lote (Callable[[list[str]], None], opcional): Função chamada com os ids de cada lote gravado.
+        prog_bar (opcional): Barra de progresso do Streamlit atualizada a cada lote gravado.
+    Returns:
+        int: A quantidade de documentos gravados.
+    """
+    lotes = [documentos[inicio: inicio + tamanho_lote] for inicio in range(0, len(documentos), tamanho_lote)]
+
+    inicio_ingestao = time.perf_counter()
+    documentos_gravados = 0
+    with ThreadPoolExecutor(max_workers=max_requisicoes) as executor:
+        futuros = {executor.submit(embeddings.embed_documents, [doc.page_content for doc in lote]): lote for lote in lotes}
+        for futuro in as_completed(futuros):
+            lote = futuros[futuro]
+            ids_lote = [doc.metadata["id_professor"] for doc in lote]
+            try:
+                # A gravação acontece somente nesta thread, uma vez por lote
+                vectordb._collection.upsert(ids=ids_lote, embeddings=futuro.result(),
+                                            documents=[doc.page_content for doc in lote], metadatas=[doc.metadata for doc in lote])
+            except Exception as e:
+                print(f"Erro ao adicionar lote de professores: {[doc.metadata['nome'] for doc in lote]} \n {e}")
+                continue
+
+            if ao_gravar_lote is not None:
+                ao_gravar_lote(ids_lote)
+
+            documentos_gravados += len(lote)
+            if prog_bar is not None:
+                vazao = documentos_gravados / (time.perf_counter() - inicio_ingestao)
+                prog_bar.progress(documentos_gravados / len(documentos), f"Carregando dados de professores... ({vazao:.1f} docs/s)")
+
+    duracao = time.perf_counter() - inicio_ingestao
+    print(f"Ingestão: {documentos_gravados} professores em {duracao:.1f}s ({documentos_gravados / max(duracao, 1e-9):.1f} docs/s) "
+          f"com {type(embeddings).__name__}")
+    return documentos_gravados
+
+def busca_professores_lote(vector_store: Chroma | BuscaNumpy | IndiceBM25, consultas: list[str], k: int = 5) -> list[list[tuple[Document, float]]]:
+    """
+    Busca os professores mais próximos de várias consultas de uma só vez.
+
+    Todas as consultas são vetorizadas em uma única chamada ao serviço de embeddings
+    e as buscas por vizinhos mais próximos são feitas em uma única consulta ao Chroma ou à busca em memória.
+    No índice BM25, as consultas são buscadas pelos seus termos, sem vetorização.
+    Args:
+        vector_store (Chroma | BuscaNumpy | IndiceBM25): A base de dados vetorial ou o índice léxico de professores.
+        consultas (list[str]): Os textos das consultas.
+        k (int): A quantidade de professores retornados por consulta.
+    Returns:
+        list[list[tuple[Document, float]]]: Para cada consulta, na mesma ordem, os professores encontrados e sua relevância,
+            na mesma escala de `similarity_search_with_relevance_scores`.
+    """
+    if not consultas:
+        return []
+    if isinstance(vector_store, IndiceBM25):
+        with instrumentacao.trecho("busca_lexica", consultas=len(consultas), k=k):
+            return vector_store.busca_lote(consultas, k)
+
+    with instrumentacao.trecho("vetorizacao_consultas", consultas=len(consultas)):
+        vetores = vetoriza_consultas(vector_store.embeddings, consultas)
+    with instrumentacao.trecho("busca_vetorial", motor=type(vector_store).__name__, consultas=len(consultas), k=k):
+        if isinstance(vector_store, BuscaNumpy):
+            return vector_store.busca_vetores(vetores, k)
+        resultado = vector_store._collection.query(query_embeddings=vetores, n_results=k, include=["documents", "metadatas", "distances"])
+    relevancia = vector_store._select_relevance_score_fn()
+
+    return [[(Document(page_content=documento, metadata=metadados or {}), relevancia(distancia))
+             for documento, metadados, distancia in zip(documentos, lista_metadados, distancias)]
+            for documentos, lista_metadados, distancias in zip(resultado["documents"], resultado["metadatas"], resultado["distances"])]
+
+def vetoriza_consultas(embeddings, consultas: list[str]) -> list[list[float]]:
+    """
+    Vetoriza várias consultas em uma única chamada ao serviço de embeddings.
+    Args:
+        embeddings (function): A função de embeddings da base de dados vetorial.
+        consultas (list[str]): Os textos das consultas.
+    Returns:
+        list[list[float]]: Os vetores das consultas, na mesma ordem.
+    """
+    if isinstance(embeddings, EmbeddingsComCache):
+        return embeddings.embed_consultas(consultas)
+    instrumentacao.conta("chamadas_embeddings")
+    instrumentacao.conta("textos_vetorizados", len(consultas))
+    return chama_embeddings_consultas(embeddings, consultas)
+
+def chama_embeddings_consultas(embeddings, consultas: list[str]) -> list[list[float]]:
+    '''Vetoriza as consultas diretamente no serviço de embeddings, sem contar a chamada no rastro; quem chama é responsável pela contagem'''
+    # O Vertex AI diferencia vetores de consulta e de documento, como em embed_query
+    if registro_modelos.eh_vertex(embeddings):
+        return embeddings.embed(consultas, embeddings_task_type="RETRIEVAL_QUERY")
+    return embeddings.embed_documents(consultas)
+
+def envolve_cache_embeddings(embeddings) -> EmbeddingsComCache:
+    """
+    Envolve a função de embeddings com o cache em memória e o cache persistente, compartilhado por todos os modelos.
+    Args:
+        embeddings (function): A função de embeddings original.
+    Returns:
+        EmbeddingsComCache: A função de embeddings com cache, usada tanto na ingestão quanto nas consultas.
+    """
+    global _cache_embeddings
+    if _cache_embeddings is None:
+        _cache_embeddings = CacheSQLite(CAMINHO_CACHE_EMBEDDINGS, max_entradas=MAX_ENTRADAS_CACHE_EMBEDDINGS)
+    modelo = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+    return EmbeddingsComCache(embeddings, _cache_embeddings, f"{type(embeddings).__name__}/{modelo}", MAX_MEMORIA_CACHE_EMBEDDINGS,
+                              lambda consultas: chama_embeddings_consultas(embeddings, consultas))
+
+def carrega_checkpoint(persist_directory: str) -> dict:
+    """
+    Carrega o checkpoint de uma ingestão interrompida.
+
+    O checkpoint só é reaproveitado se tiver sido gerado a partir do mesmo arquivo JSON;
+    caso contrário, a ingestão recomeça do início.
+    Args:
+        persist_directory (str): O diretório de persistência da base de dados vetorial.
+    Returns:
+        dict: O checkpoint com o hash do arquivo de origem e os ids dos professores já gravados.
+    """
+    novo_checkpoint = {"hash_fonte": hash_arquivo(), "ids_concluidos": []}
+    caminho = os.path.join(persist_directory, ARQUIVO_CHECKPOINT)
+    if not os.path.exists(caminho):
+        return novo_checkpoint
+
+    with open(caminho, 'r', encoding='utf-8') as file:
+        checkpoint = json.load(file)
+    if checkpoint.get("hash_fonte") != novo_checkpoint["hash_fonte"]:
+        return novo_checkpoint
+    return checkpoint
+
+def salva_checkpoint(persist_directory: str, checkpoint: dict):
+    """
+    Grava o checkpoint da ingestão de forma atômica no diretório de persistência.
+    Args:
+        persist_directory (str): O diretório de persistência da base de dados vetorial.
+        checkpoint (dict): O checkpoint a ser gravado.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    caminho = os.path.join(persist_directory, ARQUIVO_CHECKPOINT)
+    with open(caminho + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump(checkpoint, file)
+    os.replace(caminho + ".tmp", caminho)
+
+def hash_arquivo(caminho_documento = './data/json_curriculos.json') -> str:
+    """
+    Calcula o hash SHA-256 de um arquivo.
+    Args:
+        caminho_documento (str): O caminho do arquivo. O padrão é './data/json_curriculos.json'.
+    Returns:
+        str: O hash hexadecimal do conteúdo do arquivo.
+    """
+    with open(caminho_documento, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
         
 def carrega_JSON(caminho_documento = './data/json_curriculos.json'):
     """
     Carrega um arquivo JSON contendo informações de professores e retorna uma lista de objetos Document.
+
+    Cada Document contém apenas o texto a ser vetorizado e, nos metadados, o identificador do professor no catálogo.
     Args:
         caminho_documento (str): O caminho para o arquivo JSON. O padrão é './data/json_curriculos.json'.
     Returns:
-        list: Uma lista de objetos Document, onde cada objeto representa um professor com suas informações.
+        list: Uma lista de objetos Document, onde cada objeto representa um professor do catálogo.
+    """
+    return [Document(page_content=texto_embedding(registro),
+                     metadata={"id_professor": registro.id_professor,
+                               "hash_conteudo": hash_conteudo(registro),
+                               "nome": registro.nome})
+            for registro in carrega_catalogo(caminho_documento)]
+
+def carrega_catalogo(caminho_documento = './data/json_curriculos.json') -> CatalogoProfessores:
     """
+    Carrega o catálogo de professores a partir do snapshot, se houver um snapshot válido, ou do arquivo JSON.
+
+    O catálogo é lido uma única vez por processo e recarregado apenas quando o arquivo é modificado.
+    Args:
+        caminho_documento (str): O caminho para o arquivo JSON. O padrão é './data/json_curriculos.json'.
+    Returns:
+        CatalogoProfessores: O catálogo de professores indexado pelo identificador estável de cada professor.
+    """
+    snap = carrega_snapshot(caminho_documento=caminho_documento)
+    if snap is not None:
+        return snap.catalogo
+
+    modificacao = os.stat(caminho_documento).st_mtime_ns
+    em_cache = _catalogos.get(caminho_documento)
+    if em_cache is not None and em_cache[0] == modificacao:
+        return em_cache[1]
+
     with open(caminho_documento, 'r', encoding='utf-8') as file:
         lista_professores_json = json.load(file)
-        
-    for professor in lista_professores_json:
-        lista_professores_json[professor]["nome"] = professor
 
-    return [Document(page_content=str(lista_professores_json[professor])) for professor in lista_professores_json]
\ No newline at end of file
+    registros = {}
+    for nome, professor in lista_professores_json.items():
+        registro = RegistroProfessor(id_professor=id_professor(nome), nome=nome, resumo=professor.get("resumo"),
+                                     linhas_pesquisa=tuple(professor.get("linhas_pesquisa") or ()), foto=professor.get("foto"))
+        registros[registro.id_professor] = registro
+
+    catalogo = CatalogoProfessores(registros)
+    _catalogos[caminho_documento] = (modificacao, catalogo)
+    return catalogo
+
+def carrega_indice_bm25(caminho_documento = './data/json_curriculos.json') -> IndiceBM25:
+    """
+    Carrega o índice BM25 dos professores, construído a partir do catálogo uma única vez por processo
+    e reconstruído apenas quando o arquivo JSON é modificado.
+    Args:
+        caminho_documento (str): O caminho para o arquivo JSON. O padrão é './data/json_curriculos.json'.
+    Returns:
+        IndiceBM25: O índice léxico sobre o resumo e as linhas de pesquisa de cada professor.
+    """
+    modificacao = os.stat(caminho_documento).st_mtime_ns
+    em_cache = _indices_bm25.get(caminho_documento)
+    if em_cache is not None and em_cache[0] == modificacao:
+        return em_cache[1]
+
+    indice = IndiceBM25.from_catalogo(carrega_catalogo(caminho_documento))
+    _indices_bm25[caminho_documento] = (modificacao, indice)
+    return indice
+
+def carrega_snapshot(caminho_snapshot: str = CAMINHO_SNAPSHOT, caminho_documento = './data/json_curriculos.json') -> snapshot.Snapshot | None:
+    """
+    Abre o snapshot de inicialização, se ele existir e tiver sido gerado a partir do arquivo JSON atual.
+
+    O snapshot é aberto uma única vez por processo e reaberto apenas quando ele ou o arquivo JSON são modificados.
+    Args:
+        caminho_snapshot (str): O caminho do arquivo de snapshot.
+        caminho_documento (str): O caminho para o arquivo JSON de professores.
+    Returns:
+        Snapshot | None: O snapshot aberto, ou None se não houver um snapshot válido.
+    """
+    if not os.path.exists(caminho_snapshot):
+        return None
+
+    modificacao = (os.stat(caminho_snapshot).st_mtime_ns, os.stat(caminho_documento).st_mtime_ns)
+    em_cache = _snapshots.get(caminho_snapshot)
+    if em_cache is not None and em_cache[0] == modificacao:
+        return em_cache[1]
+
+    snap = snapshot.abre_snapshot(caminho_snapshot, hash_arquivo(caminho_documento))
+    _snapshots[caminho_snapshot] = (modificacao, snap)
+    return snap
+
+def gera_snapshot(caminho_snapshot: str = CAMINHO_SNAPSHOT, dtype: str = "float32", caminho_documento = './data/json_curriculos.json'):
+    """
+    Gera o snapshot de inicialização com o catálogo de professores e os embeddings de cada base vetorial existente.
+    Args:
+        caminho_snapshot (str): O caminho do arquivo de snapshot.
+        dtype (str): O tipo dos valores das matrizes de embeddings ("float32" ou "float16").
+        caminho_documento (str): O caminho para o arquivo JSON de professores.
+    """
+    catalogo = carrega_catalogo(caminho_documento)
+    linhas = {registro.id_professor: i for i, registro in enumerate(catalogo)}
+
+    modelos = {}
+    for modelo in sorted(os.listdir("data/vectorstore")):
+        colecao = Chroma(collection_name="professores", persist_directory=f"data/vectorstore/{modelo}")
+        dados = colecao.get(include=["embeddings", "documents", "metadatas"])
+        if len(dados["ids"]) == 0:
+            continue
+
+        matriz = np.zeros((len(catalogo), len(dados["embeddings"][0])), dtype=np.float32)
+        encontrados = 0
+        for vetor, documento, metadados in zip(dados["embeddings"], dados["documents"], dados["metadatas"]):
+            id = (metadados or {}).get("id_professor")
+            if id is None:
+                # Bases vetoriais antigas armazenam o dicionário do professor no conteúdo do documento
+                id = id_professor(Professor.from_Document(Document(page_content=documento)).nome or "")
+            if id in linhas:
+                matriz[linhas[id]] = vetor
+                encontrados += 1
+
+        if encontrados < len(catalogo):
+            print(f"{modelo}: {len(catalogo) - encontrados} professores do catálogo sem embedding na base vetorial")
+        modelos[modelo] = (matriz, (colecao._collection.metadata or {}).get("hnsw:space", "l2"))
+
+    os.makedirs(os.path.dirname(caminho_snapshot), exist_ok=True)
+    snapshot.grava_snapshot(caminho_snapshot, catalogo, hash_arquivo(caminho_documento), modelos, dtype)
+    print(f"Snapshot gravado em {caminho_snapshot} com {len(catalogo)} professores e os modelos {list(modelos)}")
+
+def carrega_sinteses(caminho_sinteses: str = CAMINHO_SINTESES) -> dict[str, dict]:
+    """
+    Carrega as sínteses dos professores, lidas uma única vez por processo e recarregadas apenas quando o arquivo é modificado.
+    Args:
+        caminho_sinteses (str): O caminho do arquivo JSON de sínteses.
+    Returns:
+        dict[str, dict]: As sínteses indexadas pelo identificador de cada professor, ou vazio se o arquivo não existir.
+    """
+    if not os.path.exists(caminho_sinteses):
+        return {}
+
+    modificacao = os.stat(caminho_sinteses).st_mtime_ns
+    em_cache = _sinteses.get(caminho_sinteses)
+    if em_cache is not None and em_cache[0] == modificacao:
+        return em_cache[1]
+
+    sinteses_professores = sinteses.abre_sinteses(caminho_sinteses).get("sinteses", {})
+    _sinteses[caminho_sinteses] = (modificacao, sinteses_professores)
+    return sinteses_professores
+
+def sintese_professor(professor: Professor, max_tokens: int = MAX_TOKENS_SINTESE) -> str:
+    """
+    Retorna a síntese do professor, limitada a max_tokens tokens estimados.
+
+    Usa a síntese gravada se ela tiver sido gerada a partir do conteúdo atual do professor; caso contrário, gera a síntese na hora.
+    Args:
+        professor (Professor): O professor.
+        max_tokens (int): A quantidade máxima de tokens estimados da síntese.
+    Returns:
+        str: A síntese do professor.
+    """
+    linhas_pesquisa = professor.linhas_pesquisa or []
+    gravada = carrega_sinteses().get(professor.id_professor)
+    if gravada is not None and gravada.get("hash") == sinteses.hash_sintese(professor.resumo, linhas_pesquisa):
+        return sinteses.corta_texto(gravada["texto"], max_tokens)
+    return sinteses.gera_sintese(professor.resumo, linhas_pesquisa, min(max_tokens, MAX_TOKENS_SINTESE))
+
+def gera_sinteses(caminho_sinteses: str = CAMINHO_SINTESES, max_tokens: int = MAX_TOKENS_SINTESE, caminho_documento = './data/json_curriculos.json'):
+    """
+    Gera as sínteses dos professores novos ou alterados no arquivo JSON e remove as dos professores ausentes.
+    Args:
+        caminho_sinteses (str): O caminho do arquivo JSON de sínteses.
+        max_tokens (int): A quantidade máxima de tokens estimados de cada síntese.
+        caminho_documento (str): O caminho para o arquivo JSON de professores.
+    """
+    catalogo = carrega_catalogo(caminho_documento)
+    geradas, removidas = sinteses.atualiza_sinteses(caminho_sinteses, catalogo, max_tokens)
+    print(f"Sínteses gravadas em {caminho_sinteses}: {geradas} geradas, {removidas} removidas, {len(catalogo) - geradas} mantidas")
+
+def texto_embedding(registro: RegistroProfessor) -> str:
+    """
+    Monta o texto de um professor que é vetorizado e armazenado na base de dados vetorial.
+
+    Alterações neste formato devem ser acompanhadas do incremento de VERSAO_TEXTO_EMBEDDING.
+    Args:
+        registro (RegistroProfessor): O registro do professor no catálogo.
+    Returns:
+        str: O texto a ser vetorizado.
+    """
+    return f"Linhas de pesquisa: {'; '.join(registro.linhas_pesquisa)}\nResumo: {registro.resumo or ''}"
+
+def hash_conteudo(registro: RegistroProfessor) -> str:
+    """
+    Calcula o hash do conteúdo vetorizado de um professor (resumo, linhas de pesquisa e foto) e da versão do texto vetorizado.
+    Args:
+        registro (RegistroProfessor): O registro do professor no catálogo.
+    Returns:
+        str: O hash SHA-256 hexadecimal do conteúdo do professor.
+    """
+    conteudo = {"resumo": registro.resumo, "linhas_pesquisa": list(registro.linhas_pesquisa), "foto": registro.foto,
+                "versao_texto": VERSAO_TEXTO_EMBEDDING}
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+if __name__ == "__main__":
+    # Sincroniza a base vetorial após uma atualização do arquivo JSON, ex.: python -m service.base_professores ChatGPT
+    # ou gera o snapshot de inicialização a partir das bases vetoriais, ex.: python -m service.base_professores --snapshot
+    # As sínteses dos professores são atualizadas junto com a sincronização ou isoladamente, ex.: python -m service.base_professores --sinteses
+    import argparse
+    parser = argparse.ArgumentParser(description="Sincroniza a base de dados vetorial de professores com o arquivo JSON.")
+    parser.add_argument("modelo", nargs="?", choices=[m.value for m in ModelEnum], help="Modelo cujos embeddings serão sincronizados")
+    parser.add_argument("--snapshot", action="store_true", help="Gera o snapshot de inicialização a partir das bases vetoriais existentes")
+    parser.add_argument("--float16", action="store_true", help="Armazena os embeddings do snapshot em float16")
+    parser.add_argument("--sinteses", action="store_true", help="Gera as sínteses dos professores novos ou alterados")
+    args = parser.parse_args()
+    if args.modelo is not None:
+        carrega_professores(args.modelo, sincronizar=True)
+    if args.modelo is not None or args.sinteses:
+        gera_sinteses()
+    if args.snapshot:
+        gera_snapshot(dtype="float16" if args.float16 else "float32")
+    if args.modelo is None and not args.snapshot and not args.sinteses:
+        parser.error("informe o modelo a sincronizar, --snapshot ou --sinteses")
@@ -0,0 +1,105 @@
+'''
+Este módulo implementa um índice invertido BM25 local sobre o resumo e as linhas de pesquisa dos professores.
+A busca léxica encontra termos exatos, como "ópera" ou "aprendizado de máquina", sem nenhuma chamada ao serviço de embeddings,
+e é usada junto com a busca vetorial (busca híbrida) ou sozinha, quando o serviço de embeddings está lento ou indisponível.
+'''
+
+import re
+import numpy as np
+from langchain.docstore.document import Document
+
+from domain.catalogo import CatalogoProfessores
+from domain.texto import normaliza_texto
+
+# Parâmetros do BM25: saturação da frequência dos termos e normalização pelo tamanho do documento
+K1 = 1.2
+B = 0.75
+# Quantas vezes as linhas de pesquisa são contadas em relação ao resumo, por descreverem diretamente os temas do professor
+PESO_LINHAS_PESQUISA = 2
+
+# Palavras sem valor de busca em português e inglês, já sem acentos
+STOPWORDS = frozenset("""
+    a ao aos as ate com como da das de dela dele do dos e ela ele em entre era essa esse esta este eu foi for ha isso
+    ja mais mas me mesmo muito na nas nao no nos o os ou para pela pelas pelo pelos por qual quando que se sem ser seu
+    sua suas seus so sobre tambem tem um uma umas uns
+    an and are as at be by for from has have in into is it its of on or that the their this to was were which with
+    """.split())
+
+_TOKENS = re.compile(r"\w+")
+
+
+def tokeniza(texto: str) -> list[str]:
+    '''Separa o texto em termos sem acentos e em minúsculas, descartando números, termos de uma letra e stopwords'''
+    return [termo for termo in _TOKENS.findall(normaliza_texto(texto or ""))
+            if len(termo) > 1 and not termo.isdigit() and termo not in STOPWORDS]
+
+
+class IndiceBM25:
+    '''Classe que mantém o índice invertido dos professores e realiza buscas top-k pelo BM25'''
+
+    def __init__(self, ids: list[str], documentos: list[list[str]]):
+        '''
+        Args:
+            ids (list[str]): Os identificadores dos professores.
+            documentos (list[list[str]]): Os termos de cada professor, na ordem dos identificadores.
+        '''
+        self.ids = ids
+        self.tamanhos = np.array([len(termos) for termos in documentos], dtype=np.float32)
+        tamanho_medio = float(self.tamanhos.mean()) if len(documentos) and self.tamanhos.mean() > 0 else 1.0
+
+        # Lista invertida: para cada termo, os documentos em que ele aparece e a sua frequência em cada um
+        frequencias: dict[str, dict[int, int]] = {}
+        for indice, termos in enumerate(documentos):
+            for termo in termos:
+                por_documento = frequencias.setdefault(termo, {})
+                por_documento[indice] = por_documento.get(indice, 0) + 1
+
+        # Pré-calcula o peso BM25 de cada termo em cada documento, de forma que a busca seja apenas uma soma
+        normalizacao = K1 * (1 - B + B * self.tamanhos / tamanho_medio)
+        self.idf: dict[str, float] = {}
+        self.postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for termo, por_documento in frequencias.items():
+            indices = np.fromiter(por_documento.keys(), dtype=np.int32, count=len(por_documento))
+            tf = np.fromiter(por_documento.values(), dtype=np.float32, count=len(por_documento))
+            idf = float(np.log(1 + (len(documentos) - len(indices) + 0.5) / (len(indices) + 0.5)))
+            self.idf[termo] = idf
+            self.postings[termo] = (indices, idf * tf * (K1 + 1) / (tf + normalizacao[indices]))
+
+    def from_catalogo(catalogo: CatalogoProfessores) -> "IndiceBM25":
+        '''Constrói o índice a partir do resumo e das linhas de pesquisa de cada professor do catálogo'''
+        ids, documentos = [], []
+        for registro in catalogo:
+            ids.append(registro.id_professor)
+            documentos.append(tokeniza(registro.resumo) + tokeniza(" ".join(registro.linhas_pesquisa)) * PESO_LINHAS_PESQUISA)
+        return IndiceBM25(ids, documentos)
+
+    def busca(self, consulta: str, k: int = 5) -> list[tuple[Document, float]]:
+        '''
+        Busca os `k` professores com maior pontuação BM25 para a consulta.
+        Args:
+            consulta (str): O texto da consulta.
+            k (int): A quantidade de professores retornados.
+        Returns:
+            list[tuple[Document, float]]: Os professores encontrados e sua relevância, entre 0 e 1, em ordem decrescente.
+                A relevância é a pontuação BM25 dividida pela pontuação de um professor que contivesse todos os termos da consulta.
+        '''
+        termos = [termo for termo in dict.fromkeys(tokeniza(consulta)) if termo in self.postings]
+        if not termos or not self.ids:
+            return []
+
+        pontuacoes = np.zeros(len(self.ids), dtype=np.float32)
+        for termo in termos:
+            indices, pesos = self.postings[termo]
+            pontuacoes[indices] += pesos
+        pontuacao_maxima = sum(self.idf[termo] for termo in termos) * (K1 + 1)
+
+        # Seleciona os k maiores sem ordenar todos os professores, descartando os que não contêm nenhum termo
+        k = min(k, len(self.ids))
+        indices = np.argpartition(-pontuacoes, k - 1)[:k]
+        indices = indices[np.argsort(-pontuacoes[indices])]
+        return [(Document(page_content="", metadata={"id_professor": self.ids[i]}), min(1.0, float(pontuacoes[i]) / pontuacao_maxima))
+                for i in indices if pontuacoes[i] > 0]
+
+    def busca_lote(self, consultas: list[str], k: int = 5) -> list[list[tuple[Document, float]]]:
+        '''Busca os `k` professores com maior pontuação BM25 para cada consulta, na mesma ordem das consultas'''
+        return [self.busca(consulta, k) for consulta in consultas]
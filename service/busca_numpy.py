@@ -0,0 +1,95 @@
+'''
+Este módulo implementa uma busca exata por similaridade em memória, como alternativa à busca HNSW do Chroma.
+Com cerca de mil professores, uma única multiplicação de matrizes compara todas as consultas com todos os professores.
+'''
+
+import math
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_chroma import Chroma
+
+
+class BuscaNumpy:
+    '''Classe que mantém os vetores dos professores em uma matriz contígua e normalizada e realiza buscas top-k exatas'''
+
+    def __init__(self, embeddings, matriz: np.ndarray, documentos: list[str], metadados: list[dict], espaco: str = "l2", normalizada: bool = False,
+                 ids: list[str] | None = None):
+        '''
+        Args:
+            embeddings (function): A função de embeddings usada para vetorizar as consultas.
+            matriz (np.ndarray): Os vetores dos professores, um por linha.
+            documentos (list[str]): O conteúdo de cada documento, na ordem das linhas da matriz.
+            metadados (list[dict]): Os metadados de cada documento, na ordem das linhas da matriz.
+            espaco (str): A métrica de distância da coleção de origem ("l2", "cosine" ou "ip"), usada para converter
+                a similaridade na mesma escala de relevância do Chroma.
+            normalizada (bool): Se verdadeiro, a matriz float32 já está normalizada e é usada sem cópia (ex.: uma visão do snapshot).
+            ids (list[str] | None): Os identificadores dos registros na coleção de origem, na ordem das linhas da matriz,
+                devolvidos no `id` dos documentos encontrados.
+        '''
+        self.embeddings = embeddings
+        matriz = matriz if normalizada else np.asarray(matriz, dtype=np.float32)
+        if matriz.size == 0:
+            # Coleção vazia: uma matriz sem linhas, com a dimensão dos embeddings quando ela é conhecida
+            self.matriz = np.zeros((0, matriz.shape[-1] if matriz.ndim == 2 else 0), dtype=np.float32)
+        else:
+            self.matriz = matriz if normalizada else normaliza_linhas(matriz)
+        self.documentos = documentos
+        self.metadados = metadados
+        self.espaco = espaco
+        self.ids = ids
+
+    def from_chroma(vector_store: Chroma) -> "BuscaNumpy":
+        '''Carrega todos os vetores de uma coleção do Chroma em memória'''
+        colecao = vector_store.get(include=["embeddings", "documents", "metadatas"])
+        espaco = (vector_store._collection.metadata or {}).get("hnsw:space", "l2")
+        vetores = colecao["embeddings"] if colecao["embeddings"] is not None else []
+        return BuscaNumpy(vector_store.embeddings, vetores, colecao["documents"],
+                          [metadados or {} for metadados in colecao["metadatas"]], espaco, ids=colecao["ids"])
+
+    def busca_vetores(self, vetores: list[list[float]], k: int = 5) -> list[list[tuple[Document, float]]]:
+        '''
+        Busca os `k` professores mais próximos de cada vetor de consulta.
+        Args:
+            vetores (list[list[float]]): Os vetores das consultas.
+            k (int): A quantidade de professores retornados por consulta.
+        Returns:
+            list[list[tuple[Document, float]]]: Para cada consulta, os professores encontrados e sua relevância, em ordem decrescente.
+        '''
+        # Sem professores na base, como o Chroma, nenhuma consulta tem resultados
+        if self.matriz.shape[0] == 0:
+            return [[] for _ in vetores]
+        consultas = normaliza_linhas(np.asarray(vetores, dtype=np.float32))
+        similaridades = consultas @ self.matriz.T
+        k = min(k, self.matriz.shape[0])
+
+        # Seleciona os k maiores de cada linha sem ordenar a linha inteira e depois ordena apenas os k selecionados
+        indices = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+        similaridades_k = np.take_along_axis(similaridades, indices, axis=1)
+        ordem = np.argsort(-similaridades_k, axis=1)
+        indices = np.take_along_axis(indices, ordem, axis=1)
+        similaridades_k = np.take_along_axis(similaridades_k, ordem, axis=1)
+
+        return [[(Document(page_content=self.documentos[i], metadata=self.metadados[i], id=self.ids[i] if self.ids is not None else None),
+                  self.relevancia(float(s)))
+                 for i, s in zip(linha_indices, linha_similaridades)]
+                for linha_indices, linha_similaridades in zip(indices, similaridades_k)]
+
+    def relevancia(self, similaridade: float) -> float:
+        '''Converte a similaridade de cosseno na relevância calculada pelo Chroma para a métrica da coleção de origem'''
+        match self.espaco:
+            case "cosine":
+                return similaridade
+            case "ip":
+                distancia = 1.0 - similaridade
+                return 1.0 - distancia if distancia > 0 else -distancia
+            case _:
+                # Distância euclidiana ao quadrado entre vetores unitários
+                return 1.0 - (2.0 - 2.0 * similaridade) / math.sqrt(2)
+
+
+def normaliza_linhas(matriz: np.ndarray) -> np.ndarray:
+    '''Normaliza cada linha da matriz para norma unitária, retornando uma matriz contígua'''
+    matriz = np.atleast_2d(matriz)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return np.ascontiguousarray(matriz / normas, dtype=np.float32)
@@ -0,0 +1,234 @@
+'''
+Este módulo implementa caches persistentes em SQLite, com tempo de expiração e remoção dos itens menos usados recentemente (LRU),
+o cache das chamadas estruturadas aos LLMs e o cache dos embeddings.
+'''
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Optional, Type
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel
+
+from service import instrumentacao
+
+# Limite de parâmetros por comando SQL nas operações em lote
+TAMANHO_LOTE_SQL = 500
+
+
+class CacheSQLite:
+    '''Classe que representa um cache chave-valor persistido em SQLite, com expiração e limite de tamanho por LRU'''
+
+    def __init__(self, caminho: str, ttl_segundos: Optional[float] = None, max_entradas: int = 10000):
+        '''
+        Args:
+            caminho (str): O caminho do arquivo SQLite.
+            ttl_segundos (float, opcional): Tempo de vida de cada item, em segundos. Sem expiração se None.
+            max_entradas (int): Quantidade máxima de itens; os itens acessados há mais tempo são removidos ao exceder o limite.
+        '''
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, valor BLOB NOT NULL, criado REAL NOT NULL, acesso REAL NOT NULL)")
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS cache_acesso ON cache (acesso)")
+        self._conexao.commit()
+
+    def get(self, chave: str) -> Optional[bytes]:
+        '''Retorna o valor da chave, ou None se ela não estiver no cache ou tiver expirado'''
+        agora = time.time()
+        with self._trava:
+            linha = self._conexao.execute("SELECT valor, criado FROM cache WHERE chave = ?", (chave,)).fetchone()
+            if linha is not None and self.ttl_segundos is not None and agora - linha[1] > self.ttl_segundos:
+                self._conexao.execute("DELETE FROM cache WHERE chave = ?", (chave,))
+                self._conexao.commit()
+                linha = None
+
+            if linha is None:
+                self.falhas += 1
+                return None
+
+            self._conexao.execute("UPDATE cache SET acesso = ? WHERE chave = ?", (agora, chave))
+            self._conexao.commit()
+            self.acertos += 1
+            return linha[0]
+
+    def set(self, chave: str, valor: bytes):
+        '''Grava o valor da chave, removendo os itens menos usados recentemente se o limite de tamanho for excedido'''
+        agora = time.time()
+        with self._trava:
+            self._conexao.execute("INSERT OR REPLACE INTO cache (chave, valor, criado, acesso) VALUES (?, ?, ?, ?)", (chave, valor, agora, agora))
+            excedente = self._conexao.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entradas
+            if excedente > 0:
+                self._conexao.execute("DELETE FROM cache WHERE chave IN (SELECT chave FROM cache ORDER BY acesso LIMIT ?)", (excedente,))
+            self._conexao.commit()
+
+    def get_muitos(self, chaves: list[str]) -> dict[str, bytes]:
+        '''Retorna os valores das chaves encontradas e não expiradas, em uma única transação'''
+        agora = time.time()
+        encontrados = {}
+        with self._trava:
+            for inicio in range(0, len(chaves), TAMANHO_LOTE_SQL):
+                lote = chaves[inicio: inicio + TAMANHO_LOTE_SQL]
+                marcadores = ",".join("?" * len(lote))
+                for chave, valor, criado in self._conexao.execute(f"SELECT chave, valor, criado FROM cache WHERE chave IN ({marcadores})", lote):
+                    if self.ttl_segundos is None or agora - criado <= self.ttl_segundos:
+                        encontrados[chave] = valor
+            self._conexao.executemany("UPDATE cache SET acesso = ? WHERE chave = ?", [(agora, chave) for chave in encontrados])
+            self._conexao.commit()
+            self.acertos += len(encontrados)
+            self.falhas += len(set(chaves)) - len(encontrados)
+        return encontrados
+
+    def set_muitos(self, itens: dict[str, bytes]):
+        '''Grava vários valores em uma única transação, removendo os itens menos usados recentemente se o limite for excedido'''
+        agora = time.time()
+        with self._trava:
+            self._conexao.executemany("INSERT OR REPLACE INTO cache (chave, valor, criado, acesso) VALUES (?, ?, ?, ?)",
+                                      [(chave, valor, agora, agora) for chave, valor in itens.items()])
+            excedente = self._conexao.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entradas
+            if excedente > 0:
+                self._conexao.execute("DELETE FROM cache WHERE chave IN (SELECT chave FROM cache ORDER BY acesso LIMIT ?)", (excedente,))
+            self._conexao.commit()
+
+    def estatisticas(self) -> dict:
+        '''Retorna os contadores de acertos e falhas e a quantidade de itens no cache'''
+        with self._trava:
+            entradas = self._conexao.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"acertos": self.acertos, "falhas": self.falhas, "entradas": entradas}
+
+
+class LLMEstruturadoComCache:
+    '''Classe que envolve um LLM com saída estruturada e guarda as respostas validadas em um CacheSQLite'''
+
+    def __init__(self, structured_llm, cache: CacheSQLite, modelo: str, schema: Type[BaseModel]):
+        '''
+        Args:
+            structured_llm: O LLM com saída estruturada (resultado de `with_structured_output`).
+            cache (CacheSQLite): O cache das respostas.
+            modelo (str): O nome do modelo de linguagem, que faz parte da chave do cache.
+            schema (Type[BaseModel]): O modelo Pydantic da resposta, que faz parte da chave do cache.
+        '''
+        self.structured_llm = structured_llm
+        self.cache = cache
+        self.schema = schema
+        self._prefixo = json.dumps([modelo, schema.__name__, schema.model_json_schema()], sort_keys=True, ensure_ascii=False)
+
+    def chave(self, prompt: str) -> str:
+        '''Calcula a chave do cache a partir do modelo, do schema da resposta e do prompt com espaços normalizados'''
+        return hashlib.sha256((self._prefixo + " ".join(prompt.split())).encode("utf-8")).hexdigest()
+
+    def invoke(self, prompt: str, *args, **kwargs):
+        '''Retorna a resposta em cache para o prompt ou chama o LLM e guarda a resposta validada'''
+        chave = self.chave(prompt)
+        valor = self.cache.get(chave)
+        if valor is not None:
+            try:
+                resposta = self.schema.model_validate_json(valor)
+                instrumentacao.conta("acertos_cache_llm")
+                return resposta
+            except Exception as e:
+                print(f"Resposta em cache inválida para {self.schema.__name__}: {e}")
+
+        resposta = self.structured_llm.invoke(prompt, *args, **kwargs)
+        if isinstance(resposta, self.schema):
+            self.cache.set(chave, resposta.model_dump_json().encode("utf-8"))
+        return resposta
+
+
+
+class EmbeddingsComCache(Embeddings):
+    '''Classe que envolve uma função de embeddings com um cache em memória (LRU) e um cache persistente em CacheSQLite'''
+
+    def __init__(self, embeddings: Embeddings, cache: CacheSQLite, modelo: str, max_memoria: int = 4096,
+                 vetoriza_consultas: Optional[Callable[[list[str]], list[list[float]]]] = None):
+        '''
+        Args:
+            embeddings (Embeddings): A função de embeddings original.
+            cache (CacheSQLite): O cache persistente dos vetores.
+            modelo (str): O nome do modelo de embeddings, que faz parte da chave do cache.
+            max_memoria (int): Quantidade máxima de vetores mantidos em memória.
+            vetoriza_consultas (Callable, opcional): Função que vetoriza consultas em lote com a função original,
+                para modelos que diferenciam vetores de consulta e de documento. Usa `embed_documents` se None.
+        '''
+        self.embeddings = embeddings
+        self.cache = cache
+        self.modelo = modelo
+        self.max_memoria = max_memoria
+        self.vetoriza_consultas = vetoriza_consultas or embeddings.embed_documents
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        self.chamadas = 0
+        self._memoria: OrderedDict[str, list[float]] = OrderedDict()
+        self._trava = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.vetoriza(texts, "documento", self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.vetoriza([text], "consulta", lambda textos: [self.embeddings.embed_query(textos[0])])[0]
+
+    def embed_consultas(self, textos: list[str]) -> list[list[float]]:
+        '''Vetoriza várias consultas em lote, com os mesmos vetores de `embed_query`'''
+        return self.vetoriza(textos, "consulta", self.vetoriza_consultas)
+
+    def vetoriza(self, textos: list[str], tipo: str, funcao: Callable[[list[str]], list[list[float]]]) -> list[list[float]]:
+        '''
+        Vetoriza os textos buscando primeiro no cache em memória, depois no cache persistente,
+        e chama a função de embeddings original uma única vez para os textos restantes.
+        '''
+        chaves = [self.chave(texto, tipo) for texto in textos]
+        vetores = {}
+        with self._trava:
+            for chave in chaves:
+                if chave in self._memoria:
+                    self._memoria.move_to_end(chave)
+                    vetores[chave] = self._memoria[chave]
+            self.acertos_memoria += len(vetores)
+        instrumentacao.conta("acertos_cache_embeddings", len(vetores))
+
+        faltantes = list(dict.fromkeys(chave for chave in chaves if chave not in vetores))
+        if faltantes:
+            do_disco = {chave: np.frombuffer(valor, dtype=np.float32).tolist() for chave, valor in self.cache.get_muitos(faltantes).items()}
+            vetores.update(do_disco)
+            self.acertos_disco += len(do_disco)
+            instrumentacao.conta("acertos_cache_embeddings", len(do_disco))
+
+            textos_faltantes = {chave: texto for chave, texto in zip(chaves, textos) if chave not in vetores}
+            if textos_faltantes:
+                novos = dict(zip(textos_faltantes, funcao(list(textos_faltantes.values()))))
+                self.chamadas += 1
+                self.falhas += len(novos)
+                instrumentacao.conta("chamadas_embeddings")
+                instrumentacao.conta("textos_vetorizados", len(novos))
+                self.cache.set_muitos({chave: np.asarray(vetor, dtype=np.float32).tobytes() for chave, vetor in novos.items()})
+                vetores.update(novos)
+            self.guarda_memoria({chave: vetores[chave] for chave in faltantes})
+
+        return [vetores[chave] for chave in chaves]
+
+    def guarda_memoria(self, vetores: dict[str, list[float]]):
+        '''Guarda os vetores no cache em memória, removendo os menos usados recentemente'''
+        with self._trava:
+            self._memoria.update(vetores)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def chave(self, texto: str, tipo: str) -> str:
+        '''Calcula a chave do cache a partir do modelo, do tipo do vetor (documento ou consulta) e do texto'''
+        return hashlib.sha256(f"{self.modelo}\0{tipo}\0{texto}".encode("utf-8")).hexdigest()
+
+    def estatisticas(self) -> dict:
+        '''Retorna os acertos em memória e em disco, os textos vetorizados pela função original e as chamadas feitas a ela'''
+        return {"acertos_memoria": self.acertos_memoria, "acertos_disco": self.acertos_disco,
+                "falhas": self.falhas, "chamadas": self.chamadas, "em_memoria": len(self._memoria)}
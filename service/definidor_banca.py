@@ -1,13 +1,69 @@
-import streamlit as st
+import asyncio
+import contextvars
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
 from langchain_chroma import Chroma
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_openai import ChatOpenAI
-from langchain_google_vertexai import ChatVertexAI
 
-from domain.enums import ModelEnum
-from domain.responses_models import ListaPalavrasChave, ListaVariacoesTitulo, ListaProfessores, Professor, ListaRelevanciaProfessores, ListaTraduzida
-
-def define_banca(titulo: str, resumo: str, palavras_chave: str, modelo: ModelEnum, vector_store: Chroma): 
+from domain.enums import EtapaEnum, MetodoPodaEnum, ModelEnum
+from domain.texto import normaliza_texto
+from service import base_professores, instrumentacao, registro_modelos, resiliencia
+from service.bm25 import IndiceBM25
+from service.cache import CacheSQLite, LLMEstruturadoComCache
+from service.limitador import BaldeTokens, LLMComLimite
+from domain.responses_models import ListaPalavrasChave, ListaVariacoesTitulo, ListaProfessores, Professor, ListaRelevanciaProfessores, ListaTraduzida, ExpansaoConsulta
+
+# Quantidade de professores enviados em cada chamada ao LLM na checagem de relevância
+TAMANHO_LOTE_RELEVANCIA = 5
+# Número máximo de chamadas simultâneas ao LLM na checagem de relevância
+MAX_CONCORRENCIA_RELEVANCIA = 8
+# Tempo máximo, em segundos, de cada chamada ao LLM na checagem de relevância, sem a camada de resiliência;
+# com ela, cada chamada tem o tempo máximo adaptativo e as novas tentativas de service.resiliencia
+TIMEOUT_RELEVANCIA = 60
+# Os professores são descritos ao LLM pelas suas sínteses, dentro de um orçamento de tokens por chamada;
+# se USAR_SINTESES for falso, o resumo e as linhas de pesquisa completos são enviados
+USAR_SINTESES = True
+ORCAMENTO_TOKENS_RELEVANCIA = 800
+# Cache persistente das respostas estruturadas dos LLMs; desativado se USAR_CACHE_LLM for falso
+USAR_CACHE_LLM = True
+CAMINHO_CACHE_LLM = "data/cache/llm.sqlite3"
+TTL_CACHE_LLM = 7 * 24 * 60 * 60
+MAX_ENTRADAS_CACHE_LLM = 10000
+
+# Busca híbrida: soma aos resultados da busca vetorial os do índice léxico BM25, para as mesmas consultas
+BUSCA_HIBRIDA = True
+# Poda dos candidatos antes da checagem de relevância: método de pontuação, quantidade máxima de candidatos enviados ao LLM
+# e pontuação mínima, entre 0 e 1; ao menos MIN_CANDIDATOS_RELEVANCIA candidatos são mantidos mesmo abaixo da pontuação mínima
+METODO_PODA = MetodoPodaEnum.RRF.value
+MAX_CANDIDATOS_RELEVANCIA = 15
+PONTUACAO_MINIMA_PODA = 0.1
+MIN_CANDIDATOS_RELEVANCIA = 5
+
+# Tempo máximo adaptativo, duplicatas das chamadas lentas e novas tentativas das respostas inválidas (service.resiliencia);
+# desativado se USAR_RESILIENCIA for falso
+USAR_RESILIENCIA = True
+
+# Limite global de chamadas aos LLMs, compartilhado por todas as requisições do processo; sem limite se None
+LIMITADOR_LLM: BaldeTokens | None = None
+
+_cache_llm: CacheSQLite | None = None
+_trava_cache_llm = threading.Lock()
+
+# LLMs já estruturados, por modelo, schema e configuração do cache, da resiliência e do limite
+_llms_estruturados: dict[tuple, tuple[BaseChatModel, Any]] = {}
+_trava_llms_estruturados = threading.Lock()
+
+# Função que recebe o andamento da definição da banca: a etapa, uma mensagem e, opcionalmente, os dados produzidos na etapa
+Progresso = Callable[[EtapaEnum, str, Any], None]
+
+def progresso_nulo(etapa: EtapaEnum, mensagem: str, dados: Any = None):
+    """Ignora o andamento da definição da banca."""
+
+def define_banca(titulo: str, resumo: str, palavras_chave: str, modelo: ModelEnum, vector_store: Chroma, expansao_unica: bool = False,
+                 progresso: Progresso = progresso_nulo, metodo_poda: MetodoPodaEnum = METODO_PODA, max_candidatos: int = MAX_CANDIDATOS_RELEVANCIA,
+                 pontuacao_minima: float = PONTUACAO_MINIMA_PODA, busca_hibrida: bool = BUSCA_HIBRIDA): 
     """
     Define a banca examinadora com base no título, resumo e palavras-chave fornecidos.
     Args:
@@ -16,48 +72,186 @@ def define_banca(titulo: str, resumo: str, palavras_chave: str, modelo: ModelEnu
         palavras_chave (str): Palavras-chave separadas por ponto e vírgula.
         modelo (ModelEnum): Enum que define o modelo de linguagem a ser utilizado.
         vector_store (Chroma): Base de dados vetorial para busca de professores.
+        expansao_unica (bool): Se verdadeiro, extrai palavras-chave, gera variações de título e traduz em uma única chamada ao LLM,
+            voltando às três chamadas separadas caso a resposta seja inválida.
+        progresso (Progresso): Função que recebe o andamento de cada etapa, ex.: para exibi-lo no Streamlit.
+        metodo_poda (MetodoPodaEnum): Forma de pontuar os candidatos na poda anterior à checagem de relevância; NENHUMA desativa a poda.
+        max_candidatos (int): Quantidade máxima de candidatos enviados ao LLM na checagem de relevância.
+        pontuacao_minima (float): Pontuação de poda mínima, entre 0 e 1, para que o candidato seja enviado ao LLM.
+        busca_hibrida (bool): Se verdadeiro, soma aos resultados da busca vetorial os resultados do índice léxico BM25.
     Returns:
         lista_professores_final (list): Lista de professores sugeridos para a banca, ordenados por relevância.
     """
-    # Seleciona o modelo de linguagem com base no enum fornecido
-    match modelo:
-        case ModelEnum.CHATGPT.value:
-            llm = ChatOpenAI(model="gpt-4o-mini")
-        case ModelEnum.GEMINI.value:
-            llm = ChatVertexAI(model="gemini-1.5-flash-001")
+    lista_professores_final = []
+    with instrumentacao.rastreia("define_banca", modelo=modelo, expansao_unica=expansao_unica):
+        for etapa, professores in define_banca_incremental(titulo, resumo, palavras_chave, modelo, vector_store, expansao_unica, progresso,
+                                                           metodo_poda, max_candidatos, pontuacao_minima, busca_hibrida):
+            if etapa == EtapaEnum.CONCLUSAO:
+                lista_professores_final = professores
+    
+    return lista_professores_final
 
-    # Exibe status no Streamlit
-    with st.status("Definindo banca", expanded=True):
+def define_banca_incremental(titulo: str, resumo: str, palavras_chave: str, modelo: ModelEnum, vector_store: Chroma, expansao_unica: bool = False,
+                             progresso: Progresso = progresso_nulo, metodo_poda: MetodoPodaEnum = METODO_PODA,
+                             max_candidatos: int = MAX_CANDIDATOS_RELEVANCIA, pontuacao_minima: float = PONTUACAO_MINIMA_PODA,
+                             busca_hibrida: bool = BUSCA_HIBRIDA) -> Iterator[tuple[EtapaEnum, list[Professor]]]:
+    """
+    Define a banca examinadora como `define_banca`, entregando os professores à medida que ficam prontos,
+    para que a interface exiba os candidatos logo após a busca, sem esperar a checagem de relevância.
+    As etapas são registradas no rastro atual, se houver; para rastrear a requisição, percorra o gerador dentro de `instrumentacao.rastreia`.
+    Args:
+        titulo (str): O título do trabalho.
+        resumo (str): O resumo do trabalho.
+        palavras_chave (str): Palavras-chave separadas por ponto e vírgula.
+        modelo (ModelEnum): Enum que define o modelo de linguagem a ser utilizado.
+        vector_store (Chroma): Base de dados vetorial para busca de professores.
+        expansao_unica (bool): Se verdadeiro, expande a consulta em uma única chamada ao LLM.
+        progresso (Progresso): Função que recebe o andamento de cada etapa.
+        metodo_poda (MetodoPodaEnum): Forma de pontuar os candidatos na poda anterior à checagem de relevância; NENHUMA desativa a poda.
+        max_candidatos (int): Quantidade máxima de candidatos enviados ao LLM na checagem de relevância.
+        pontuacao_minima (float): Pontuação de poda mínima, entre 0 e 1, para que o candidato seja enviado ao LLM.
+        busca_hibrida (bool): Se verdadeiro, soma aos resultados da busca vetorial os resultados do índice léxico BM25.
+    Yields:
+        tuple[EtapaEnum, list[Professor]]: (BUSCA, candidatos podados, ordenados por relevância) assim que a busca termina;
+            (RELEVANCIA, professores do lote) a cada lote com a relevância checada, na ordem em que os lotes terminam;
+            e, por fim, (CONCLUSAO, lista final de professores).
+    """
+    # Obtém o cliente do modelo de linguagem, compartilhado por todas as requisições do processo
+    llm = registro_modelos.obtem_llm(modelo)
+
+    # Expande a consulta em uma única chamada, se solicitado
+    expansao = expande_consulta(titulo, resumo, palavras_chave, llm, progresso) if expansao_unica else None
+
+    if expansao is not None:
+        palavras_chave_extraidas_titulo, variacoes_titulo, traduzidos = expansao.separa_etapas()
+        set_palavraschave = set(palavras_chave_extraidas_titulo.palavras_chave).union(set(palavras_chave.split(";")))
+        variacoes_titulo.titulos.extend([titulo, resumo])
+    else:
         # Extrai palavras-chave do título e resumo
-        palavras_chave_extraidas_titulo = extrai_palavraschave_titulo(titulo, resumo, llm)
+        palavras_chave_extraidas_titulo = extrai_palavraschave_titulo(titulo, resumo, llm, progresso)
         set_palavraschave = set(palavras_chave_extraidas_titulo.palavras_chave).union(set(palavras_chave.split(";")))
 
         # Gera variações do título
-        variacoes_titulo = gera_variacoes_titulo(titulo, resumo, set_palavraschave, llm)
+        variacoes_titulo = gera_variacoes_titulo(titulo, resumo, set_palavraschave, llm, progresso)
         variacoes_titulo.titulos.extend([titulo, resumo])
 
         # Traduz título e resumo para inglês
-        traduzidos = traduz_titulos_e_palavraschave(variacoes_titulo.titulos, set_palavraschave, llm)
-        set_palavraschave = set_palavraschave.union(set(traduzidos.palavras_chave))
-        variacoes_titulo.titulos.extend(traduzidos.palavras_chave)
+        traduzidos = traduz_titulos_e_palavraschave(variacoes_titulo.titulos, set_palavraschave, llm, progresso)
 
-        # Procura professores relevantes
-        lista_professores = procura_professores(vector_store, set_palavraschave, variacoes_titulo).ordena_por_relevancia()
-        
-        # Checa a relevância dos professores encontrados
-        lista_professores_final = checa_relevancia(resumo, llm, set_palavraschave, variacoes_titulo, lista_professores)
+    set_palavraschave = set_palavraschave.union(set(traduzidos.palavras_chave))
+    variacoes_titulo.titulos.extend(traduzidos.palavras_chave)
 
-        st.write("Sugestão de Banca definida!")
+    # Procura professores relevantes, descarta os candidatos fracos e entrega os demais antes da checagem de relevância
+    lista_professores = procura_professores(vector_store, set_palavraschave, variacoes_titulo, progresso, busca_hibrida)
+    lista_professores = poda_candidatos(lista_professores, metodo_poda, max_candidatos, pontuacao_minima, progresso).ordena_por_relevancia()
+    yield EtapaEnum.BUSCA, lista_professores.professores
     
-    return lista_professores_final
+    # Checa a relevância dos professores encontrados, entregando cada lote assim que termina
+    for lote_professores in checa_relevancia_incremental(resumo, llm, set_palavraschave, variacoes_titulo, lista_professores, progresso=progresso):
+        yield EtapaEnum.RELEVANCIA, lote_professores
+
+    progresso(EtapaEnum.CONCLUSAO, "Sugestão de Banca definida!")
+    
+    yield EtapaEnum.CONCLUSAO, lista_professores.professores
+
+def estrutura_llm(llm: BaseChatModel, schema):
+    """
+    Estrutura o LLM para responder no formato do schema, com as respostas guardadas no cache persistente
+    e as chamadas ao LLM sujeitas ao limite global LIMITADOR_LLM e à camada de resiliência (tempo máximo adaptativo, duplicatas e novas tentativas).
+    Args:
+        llm (BaseChatModel): Modelo de linguagem a ser estruturado.
+        schema: O modelo Pydantic da resposta.
+    Returns:
+        O LLM estruturado, envolvido pelo cache se USAR_CACHE_LLM for verdadeiro.
+        É criado uma única vez para cada modelo e schema, e reutilizado pelas chamadas seguintes.
+    """
+    # Os modelos Pydantic não são hasheáveis, então o modelo entra na chave pelo id e é mantido junto com o LLM estruturado,
+    # de forma que o id não pode ser reutilizado por outro objeto enquanto a entrada existir; o limite entra na chave pelo próprio objeto
+    chave = (id(llm), schema, USAR_CACHE_LLM, USAR_RESILIENCIA, LIMITADOR_LLM)
+    with _trava_llms_estruturados:
+        if chave not in _llms_estruturados:
+            _llms_estruturados[chave] = (llm, cria_llm_estruturado(llm, schema))
+        return _llms_estruturados[chave][1]
+
+def cria_llm_estruturado(llm: BaseChatModel, schema):
+    '''Envolve o LLM estruturado com a instrumentação, o limite global de chamadas, a camada de resiliência e o cache persistente'''
+    modelo = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    # A mensagem original do LLM é mantida para contar os tokens de cada chamada
+    structured_llm = instrumentacao.LLMInstrumentado(llm.with_structured_output(schema, include_raw=True))
+    # As latências são observadas por modelo e schema, ou seja, por etapa da definição da banca; a camada de resiliência obtém
+    # a ficha do limite global antes de contar o tempo de cada requisição, para que a espera na fila não conte como latência do LLM
+    if USAR_RESILIENCIA:
+        structured_llm = resiliencia.LLMResiliente(structured_llm, f"{modelo}/{schema.__name__}", resiliencia.ORCAMENTO_HEDGE, LIMITADOR_LLM)
+    elif LIMITADOR_LLM is not None:
+        structured_llm = LLMComLimite(structured_llm, LIMITADOR_LLM)
+    if not USAR_CACHE_LLM:
+        return structured_llm
+    return LLMEstruturadoComCache(structured_llm, obtem_cache_llm(), modelo, schema)
+
+def obtem_cache_llm() -> CacheSQLite:
+    """
+    Retorna o cache persistente das respostas dos LLMs, criando-o na primeira chamada.
+    Returns:
+        CacheSQLite: O cache compartilhado por todas as chamadas do processo.
+    """
+    global _cache_llm
+    with _trava_cache_llm:
+        if _cache_llm is None:
+            _cache_llm = CacheSQLite(CAMINHO_CACHE_LLM, TTL_CACHE_LLM, MAX_ENTRADAS_CACHE_LLM)
+    return _cache_llm
+
+@instrumentacao.trecho(EtapaEnum.EXPANSAO.value)
+def expande_consulta(titulo: str, resumo: str, palavras_chave: str, llm: BaseChatModel, progresso: Progresso = progresso_nulo) -> ExpansaoConsulta | None:
+    """
+    Extrai palavras-chave, gera variações de título e traduz títulos e palavras-chave para o inglês em uma única chamada ao LLM.
+    Args:
+        titulo (str): O título do trabalho de mestrado.
+        resumo (str): O resumo do trabalho de mestrado.
+        palavras_chave (str): Palavras-chave informadas pelo usuário, separadas por ponto e vírgula.
+        llm (BaseChatModel): Modelo de linguagem utilizado para a expansão.
+        progresso (Progresso): Função que recebe o andamento da etapa.
+    Returns:
+        ExpansaoConsulta | None: A expansão da consulta, ou None se a resposta do LLM for inválida ou incompleta.
+    """
+    expansao_prompt = f'''
+        A partir do título "{titulo}", das palavras-chave "{palavras_chave}" e do resumo abaixo, expanda a consulta do trabalho de mestrado.
+        Resumo: {resumo}
+        1. Extraia as áreas de pesquisa e palavras-chave do trabalho, respondendo às perguntas:
+            - O trabalho é de qual área do conhecimento? Qual curso de graduação é mais próximo do tema?
+            - Quais são os principais objetivos do trabalho? Quais as palavras chave que descrevem o tema geral do trabalho?
+            - O que o trabalho se propõe a pesquisar? Qual pergunta ele tenta responder?
+        2. Sugira 5 novos títulos para o trabalho, destacando algumas palavras-chave e combinando-as de diversas formas.
+        3. Translate the original title, the 5 new titles and all keywords (extracted and given) to English.
+    '''
+    progresso(EtapaEnum.EXPANSAO, "Expandindo título, palavras-chave e traduções...")
+
+    #Chamada única ao LLM para extrair, variar e traduzir
+    structured_llm = estrutura_llm(llm, ExpansaoConsulta)
+    try:
+        resposta = structured_llm.invoke(expansao_prompt)
+    except Exception as e:
+        print(f"Erro na expansão da consulta em chamada única: {e}")
+        return None
+
+    if resposta is None or not (resposta.palavras_chave and resposta.titulos and resposta.palavras_chave_traduzidas):
+        print("Expansão da consulta em chamada única incompleta, utilizando as três etapas separadas")
+        return None
+
+    progresso(EtapaEnum.EXPANSAO, "Palavras-chave a partir do título e resumo", resposta.palavras_chave)
+    progresso(EtapaEnum.EXPANSAO, "Titulos para mestrado: ", resposta.titulos)
+    progresso(EtapaEnum.EXPANSAO, "Títulos e palavras-chave traduzidos: ", resposta.separa_etapas()[2])
+
+    return resposta
 
-def extrai_palavraschave_titulo(titulo: str, resumo:str, llm: BaseChatModel) ->  ListaPalavrasChave:
+@instrumentacao.trecho(EtapaEnum.EXTRACAO.value)
+def extrai_palavraschave_titulo(titulo: str, resumo:str, llm: BaseChatModel, progresso: Progresso = progresso_nulo) ->  ListaPalavrasChave:
     """
     Extrai palavras-chave do título e resumo de um trabalho de mestrado.
     Args:
         titulo (str): O título do trabalho de mestrado.
         resumo (str): O resumo do trabalho de mestrado.
         llm (BaseChatModel): Modelo de linguagem utilizado para a extração das palavras-chave.
+        progresso (Progresso): Função que recebe o andamento da etapa.
     Returns:
         ListaPalavrasChave: Objeto contendo as palavras-chave extraídas do título e resumo.
     """
@@ -69,18 +263,18 @@ def extrai_palavraschave_titulo(titulo: str, resumo:str, llm: BaseChatModel) ->
             - Quais são os principais objetivos do trabalho? Quais as palavras chave que descrevem o tema geral do trabalho?
             - O que o trabalho se propõe a pesquisar? Qual pergunta ele tenta responder?
     '''
-    st.write("Extraindo áreas de pesquisa do título...")
+    progresso(EtapaEnum.EXTRACAO, "Extraindo áreas de pesquisa do título...")
     
     #Chamada ao LLM para extrair as áreas de pesquisa
-    structured_llm = llm.with_structured_output(ListaPalavrasChave)
+    structured_llm = estrutura_llm(llm, ListaPalavrasChave)
     resposta = structured_llm.invoke(theme_extractor_prompt)
 
-    st.write(f"Palavras-chave a partir do título e resumo")
-    st.write(resposta.palavras_chave)
+    progresso(EtapaEnum.EXTRACAO, "Palavras-chave a partir do título e resumo", resposta.palavras_chave)
 
     return resposta
 
-def gera_variacoes_titulo(titulo: str, resumo:str, palavraschave: set, llm: BaseChatModel) -> ListaVariacoesTitulo:
+@instrumentacao.trecho(EtapaEnum.VARIACAO.value)
+def gera_variacoes_titulo(titulo: str, resumo:str, palavraschave: set, llm: BaseChatModel, progresso: Progresso = progresso_nulo) -> ListaVariacoesTitulo:
     """
     Gera variações de título para um trabalho de mestrado com base no título original, resumo e palavras-chave fornecidos.
     Args:
@@ -88,31 +282,33 @@ def gera_variacoes_titulo(titulo: str, resumo:str, palavraschave: set, llm: Base
         resumo (str): O resumo do trabalho de mestrado.
         palavraschave (set): Um conjunto de palavras-chave relacionadas ao trabalho.
         llm (BaseChatModel): Um modelo de linguagem que será usado para gerar as variações de título.
+        progresso (Progresso): Função que recebe o andamento da etapa.
     Returns:
         ListaVariacoesTitulo: Uma lista contendo as variações de título geradas.
     """
     theme_extractor_prompt = f'''
-        Sugira 5 novos títulos para o trabalho de mestrado com título {titulo} e palavras chave {palavraschave}.
+        Sugira 5 novos títulos para o trabalho de mestrado com título {titulo} e palavras chave {sorted(palavraschave)}.
         Resumo: {resumo}
         Tente destacar algumas palavras-chaves no título e use-as como base para gerar novas variações, combinando-as de deiversas formas.
     '''
-    st.write("Variando título...")
+    progresso(EtapaEnum.VARIACAO, "Variando título...")
 
     #Chamada ao LLM para gerar as variações de título
-    structured_llm = llm.with_structured_output(ListaVariacoesTitulo)
+    structured_llm = estrutura_llm(llm, ListaVariacoesTitulo)
     resposta = structured_llm.invoke(theme_extractor_prompt)
 
-    st.write(f"Titulos para mestrado: ")
-    st.write(resposta.titulos)
+    progresso(EtapaEnum.VARIACAO, "Titulos para mestrado: ", resposta.titulos)
 
     return resposta
 
-def traduz_titulos_e_palavraschave(titulos: list[str], palavras_chave: set, llm: BaseChatModel) -> ListaTraduzida:
+@instrumentacao.trecho(EtapaEnum.TRADUCAO.value)
+def traduz_titulos_e_palavraschave(titulos: list[str], palavras_chave: set, llm: BaseChatModel, progresso: Progresso = progresso_nulo) -> ListaTraduzida:
     """
     Traduz uma lista de títulos para o inglês.
     Args:
         titulos (list[str]): Lista de títulos a serem traduzidos.
         llm (BaseChatModel): Modelo de linguagem utilizado para a tradução.
+        progresso (Progresso): Função que recebe o andamento da etapa.
     Returns:
         list[str]: Lista de títulos traduzidos para o inglês.
     """
@@ -124,19 +320,20 @@ def traduz_titulos_e_palavraschave(titulos: list[str], palavras_chave: set, llm:
         
 
         keywords:
-        {palavras_chave}
+        {sorted(palavras_chave)}
     '''
-    st.write("Traduzindo títulos e palavras-chave para o inglês...")
+    progresso(EtapaEnum.TRADUCAO, "Traduzindo títulos e palavras-chave para o inglês...")
 
     #Chamada ao LLM para traduzir os títulos
-    structured_llm = llm.with_structured_output(ListaTraduzida)
+    structured_llm = estrutura_llm(llm, ListaTraduzida)
     resposta = structured_llm.invoke(traducao_prompt)
 
-    st.write(f"Títulos e palavras-chave traduzidos: ")
-    st.write(resposta)
+    progresso(EtapaEnum.TRADUCAO, "Títulos e palavras-chave traduzidos: ", resposta)
     return resposta
 
-def procura_professores(vector_store: Chroma, set_palavraschave: set, variacoes_titulo: ListaVariacoesTitulo) -> ListaProfessores:
+@instrumentacao.trecho(EtapaEnum.BUSCA.value)
+def procura_professores(vector_store: Chroma, set_palavraschave: set, variacoes_titulo: ListaVariacoesTitulo, progresso: Progresso = progresso_nulo,
+                        busca_hibrida: bool = BUSCA_HIBRIDA) -> ListaProfessores:
     """
     Procura professores relevantes com base em um conjunto de palavras-chave e variações de títulos.
 
@@ -144,34 +341,100 @@ def procura_professores(vector_store: Chroma, set_palavraschave: set, variacoes_
         vector_store (Chroma): Objeto que permite realizar buscas de similaridade.
         set_palavraschave (set): Conjunto de palavras-chave para a busca.
         variacoes_titulo (ListaVariacoesTitulo): Objeto contendo variações de títulos para a busca.
+        progresso (Progresso): Função que recebe o andamento da etapa.
+        busca_hibrida (bool): Se verdadeiro, também busca as mesmas consultas no índice léxico BM25. Um professor encontrado
+            nas duas buscas acumula as ocorrências e as posições de ambas, o que equivale a fundir os dois rankings;
+            a similaridade do professor continua sendo apenas a da busca vetorial.
 
     Returns:
         ListaProfessores: Lista de professores encontrados com base na busca de similaridade.
     """
-    st.write("Procurando professores...")
-
-    # Busca os professores mais próximos para cada variação de título
-    lista_professores = ListaProfessores(professores=[])
-    for titulo in variacoes_titulo.titulos:
-        cinco_professores_mais_proximos = vector_store.similarity_search_with_relevance_scores(f"{titulo} {set_palavraschave}", k=5)
-        lista_professores.add_professores([Professor.from_tuple_json_similarity(professor) for professor in cinco_professores_mais_proximos])
+    progresso(EtapaEnum.BUSCA, "Procurando professores...")
+
+    # Busca os professores mais próximos de todas as variações de título de uma só vez, sem consultas repetidas
+    consultas = list(dict.fromkeys(f"{titulo} {sorted(set_palavraschave)}" for titulo in variacoes_titulo.titulos))
+    resultados = [(resultado, False) for resultado in base_professores.busca_professores_lote(vector_store, consultas, k=5)]
+    if busca_hibrida and not isinstance(vector_store, IndiceBM25):
+        # Os resultados léxicos contam nas ocorrências e nas posições, mas não na similaridade vetorial exibida ao usuário
+        resultados += [(resultado, True) for resultado in base_professores.busca_professores_lote(base_professores.carrega_indice_bm25(), consultas, k=5)]
+    catalogo = base_professores.carrega_catalogo()
+
+    # Acumula as ocorrências de cada professor, construindo-o apenas na primeira vez em que é encontrado; nas bases vetoriais antigas,
+    # sem o identificador nos metadados, o professor já construído é encontrado pelo conteúdo do documento
+    lista_professores = ListaProfessores(professores=[], total_pesquisas=len(resultados), total_pesquisas_lexicas=sum(lexica for _, lexica in resultados))
+    chaves_por_conteudo: dict[str, str] = {}
+    for cinco_professores_mais_proximos, lexica in resultados:
+        for posicao, (documento, similaridade) in enumerate(cinco_professores_mais_proximos, start=1):
+            chave = documento.metadata.get("id_professor") or chaves_por_conteudo.get(documento.page_content)
+            professor = lista_professores.busca(chave)
+            if professor is not None:
+                professor.registra_ocorrencia(similaridade, posicao, lexica)
+            else:
+                professor = Professor.from_tuple_catalogo((documento, similaridade), catalogo, posicao, lexica)
+                if professor is None:
+                    # Professor da base vetorial que não está mais no catálogo: a base precisa ser sincronizada
+                    instrumentacao.conta("professores_fora_catalogo")
+                    print(f"Professor {documento.metadata.get('id_professor')} encontrado na busca não está no catálogo; sincronize a base vetorial")
+                    continue
+                if professor.nome is None:
+                    instrumentacao.conta("falhas_desserializacao")
+                lista_professores.add_professor(professor)
+                if not documento.metadata.get("id_professor"):
+                    chaves_por_conteudo[documento.page_content] = professor.chave()
     
-    st.write(f"{len(lista_professores.professores)} Professores encontrados!")
+    progresso(EtapaEnum.BUSCA, f"{len(lista_professores.professores)} Professores encontrados!")
+
+    return lista_professores
+
+@instrumentacao.trecho(EtapaEnum.PODA.value)
+def poda_candidatos(lista_professores: ListaProfessores, metodo_poda: MetodoPodaEnum = METODO_PODA, max_candidatos: int = MAX_CANDIDATOS_RELEVANCIA,
+                    pontuacao_minima: float = PONTUACAO_MINIMA_PODA, progresso: Progresso = progresso_nulo) -> ListaProfessores:
+    """
+    Descarta os candidatos com menor pontuação de poda antes da checagem de relevância, que é a etapa mais cara da definição da banca.
+
+    Args:
+        lista_professores (ListaProfessores): Lista de professores encontrados na busca.
+        metodo_poda (MetodoPodaEnum): Forma de pontuar os candidatos: fusão das posições recíprocas (RRF) ou similaridade média em todas as pesquisas.
+        max_candidatos (int): Quantidade máxima de candidatos mantidos.
+        pontuacao_minima (float): Pontuação mínima, entre 0 e 1, para que o candidato seja mantido.
+        progresso (Progresso): Função que recebe o andamento da etapa.
+
+    Returns:
+        ListaProfessores: A mesma lista, apenas com os candidatos mantidos.
+    """
+    total_antes = len(lista_professores.professores)
+    removidos = lista_professores.poda(metodo_poda, max_candidatos, pontuacao_minima, MIN_CANDIDATOS_RELEVANCIA)
+
+    # Cada lote de TAMANHO_LOTE_RELEVANCIA candidatos descartado é uma chamada a menos ao LLM
+    total_depois = len(lista_professores.professores)
+    chamadas_economizadas = math.ceil(total_antes / TAMANHO_LOTE_RELEVANCIA) - math.ceil(total_depois / TAMANHO_LOTE_RELEVANCIA)
+    instrumentacao.conta("candidatos_descartados", len(removidos))
+    instrumentacao.conta("chamadas_llm_economizadas", chamadas_economizadas)
+    progresso(EtapaEnum.PODA, f"{len(removidos)} de {total_antes} candidatos descartados, {chamadas_economizadas} chamadas ao LLM economizadas",
+              [professor.nome for professor in removidos] or None)
 
     return lista_professores
 
 # Função para checar a relevância dos professores encontrados
-def checa_relevancia(resumo, llm, set_palavraschave, variacoes_titulo, lista_professores: ListaProfessores) -> list[Professor]:
+def checa_relevancia_incremental(resumo, llm, set_palavraschave, variacoes_titulo, lista_professores: ListaProfessores,
+                                 max_concorrencia: int = MAX_CONCORRENCIA_RELEVANCIA, timeout: float = TIMEOUT_RELEVANCIA,
+                                 progresso: Progresso = progresso_nulo) -> Iterator[list[Professor]]:
     """
     Verifica a relevância dos professores para um trabalho de mestrado com base no resumo, palavras-chave e variações de título fornecidos.
+
+    Os professores são enviados ao LLM em lotes independentes, executados simultaneamente, e cada lote é entregue assim que a sua chamada ao LLM termina.
+
     Args:
         resumo (str): Resumo do trabalho de mestrado.
         llm (LLM): Modelo de linguagem utilizado para análise.
         set_palavraschave (set): Conjunto de palavras-chave que descrevem a área de pesquisa e objetivos.
         variacoes_titulo (VariacoesTitulo): Objeto contendo variações de títulos do trabalho de mestrado.
         lista_professores (ListaProfessores): Lista de professores candidatos a avaliar o trabalho de mestrado.
-    Returns:
-        list[Professor]: Lista de professores com a relevância atualizada e justificativas.
+        max_concorrencia (int): Número máximo de chamadas simultâneas ao LLM.
+        timeout (float): Tempo máximo, em segundos, de cada chamada ao LLM, se USAR_RESILIENCIA for falso. Lotes que excedem o tempo ficam sem justificativa.
+        progresso (Progresso): Função que recebe o andamento da etapa.
+    Yields:
+        list[Professor]: Os professores de cada lote, com as justificativas atualizadas, na ordem em que os lotes terminam.
     """
     contextualize_q_system_prompt = f'''
             Você é um sistema assistente de definição de bancas de mestrado.
@@ -181,24 +444,93 @@ def checa_relevancia(resumo, llm, set_palavraschave, variacoes_titulo, lista_pro
             Os professores devem ser escolhidos de acordo com a familiaridade com algum dos temas tratados no trabalho de mestrado.
             Titulos: {variacoes_titulo.titulos}
             Resumo: {resumo}
-            Palavras-chave: {set_palavraschave}
+            Palavras-chave: {sorted(set_palavraschave)}
         '''
-    st.write("Checando relevância dos professores encontrados...")
+    progresso(EtapaEnum.RELEVANCIA, "Checando relevância dos professores encontrados...")
 
     # Estrutura o LLM para responder a relevância dos professores
-    structured_llm = llm.with_structured_output(ListaRelevanciaProfessores)
-    lista_relevancia = ListaRelevanciaProfessores()
+    structured_llm = estrutura_llm(llm, ListaRelevanciaProfessores)
     lista_professores_ = lista_professores.professores
 
-    # Chamadas ao LLM para definir a relevância de cada professor
-    for id in range(0, len(lista_professores_), 5): # Chama o LLM de 5 em 5 professores
-        resposta = define_relevancia(structured_llm, contextualize_q_system_prompt, lista_professores_, id)
-        lista_relevancia.add_relevancias(resposta.relevancia_professores)
-    
-    # Atualiza a relevância dos professores na lista
-    inclui_relevancia_professor(lista_relevancia, lista_professores_)
+    # Chamadas simultâneas ao LLM; cada lote é atualizado com as suas justificativas assim que a sua resposta chega
+    with instrumentacao.trecho(EtapaEnum.RELEVANCIA.value, professores=len(lista_professores_)):
+        relevancias = define_relevancias_conforme_concluidas(structured_llm, contextualize_q_system_prompt, lista_professores_, max_concorrencia, timeout)
+        for id, resposta in itera_assincrono(relevancias):
+            lote_professores = lista_professores_[id: id + TAMANHO_LOTE_RELEVANCIA]
+            inclui_relevancia_professor(resposta or ListaRelevanciaProfessores(), lote_professores)
+            yield lote_professores
+
+async def define_relevancias_conforme_concluidas(structured_llm, prompt: str, lista_professores: list[Professor],
+                                                 max_concorrencia: int = MAX_CONCORRENCIA_RELEVANCIA,
+                                                 timeout: float = TIMEOUT_RELEVANCIA) -> AsyncIterator[tuple[int, ListaRelevanciaProfessores | None]]:
+    """
+    Executa `define_relevancia` para todos os lotes de professores, com no máximo `max_concorrencia` chamadas simultâneas,
+    entregando a resposta de cada lote assim que ela chega.
 
-    return lista_professores_
+    Args:
+        structured_llm: Um modelo de linguagem estruturado com ListaRelevanciaProfessores como saída.
+        prompt (str): O prompt que será usado para gerar as respostas.
+        lista_professores (list[Professor]): A lista completa de professores candidatos.
+        max_concorrencia (int): Número máximo de chamadas simultâneas ao LLM.
+        timeout (float): Tempo máximo, em segundos, de cada chamada ao LLM, se USAR_RESILIENCIA for falso.
+
+    Yields:
+        tuple[int, ListaRelevanciaProfessores | None]: O índice inicial do lote e a sua resposta, ou None se o lote falhou.
+    """
+    semaforo = asyncio.Semaphore(max_concorrencia)
+    # Com a camada de resiliência, o tempo máximo adaptativo e as novas tentativas já limitam a duração de cada lote
+    timeout_lote = None if USAR_RESILIENCIA else timeout
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_concorrencia)
+
+    async def define_relevancia_lote(id: int):
+        # O tempo máximo começa a contar quando o lote obtém uma vaga, e não enquanto aguarda na fila
+        async with semaforo:
+            try:
+                # Executa o lote com uma cópia do contexto, para que ele seja registrado no rastro atual
+                contexto = contextvars.copy_context()
+                return id, await asyncio.wait_for(loop.run_in_executor(executor, contexto.run, define_relevancia, structured_llm, prompt, lista_professores, id), timeout_lote)
+            except Exception as e:
+                instrumentacao.conta("falhas_relevancia")
+                print(f"Erro ao checar relevância dos professores {id} a {min(id + TAMANHO_LOTE_RELEVANCIA, len(lista_professores)) - 1}: {e!r}")
+                return id, None
+
+    tarefas = [asyncio.ensure_future(define_relevancia_lote(id)) for id in range(0, len(lista_professores), TAMANHO_LOTE_RELEVANCIA)]
+    try:
+        for proxima in asyncio.as_completed(tarefas):
+            yield await proxima
+    finally:
+        # Cancela os lotes pendentes se a iteração for interrompida e não espera por chamadas que excederam o tempo máximo
+        for tarefa in tarefas:
+            tarefa.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def itera_assincrono(gerador_assincrono: AsyncIterator) -> Iterator:
+    """
+    Percorre um gerador assíncrono a partir de código síncrono, em um laço de eventos próprio.
+
+    Args:
+        gerador_assincrono (AsyncIterator): O gerador assíncrono a ser percorrido.
+
+    Yields:
+        Os itens do gerador assíncrono, à medida que ficam prontos.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(gerador_assincrono))
+            except StopAsyncIteration:
+                break
+    finally:
+        # Encerra o gerador e as tarefas pendentes mesmo se a iteração for interrompida
+        loop.run_until_complete(gerador_assincrono.aclose())
+        pendentes = asyncio.all_tasks(loop)
+        for tarefa in pendentes:
+            tarefa.cancel()
+        if pendentes:
+            loop.run_until_complete(asyncio.wait(pendentes))
+        loop.close()
 
 def define_relevancia(structured_llm, prompt: str, lista_professores: list[Professor], id: int) -> ListaRelevanciaProfessores:
     """
@@ -214,16 +546,21 @@ def define_relevancia(structured_llm, prompt: str, lista_professores: list[Profe
         resposta (ListaRelevanciaProfessores): A resposta gerada pelo modelo de linguagem estruturado com base no prompt e nos professores selecionados.
     """
     # Define a função lambda para calcular o índice final, garantindo que não exceda o tamanho da lista
-    id_final = lambda x: x+5 if x+5 < len(lista_professores) else len(lista_professores)
+    id_final = lambda x: x+TAMANHO_LOTE_RELEVANCIA if x+TAMANHO_LOTE_RELEVANCIA < len(lista_professores) else len(lista_professores)
     
     # Seleciona um subconjunto de cinco professores a partir do índice atual
     cinco_professores = lista_professores[id: id_final(id)]
     
-    # Converte a lista de cinco professores em uma string formatada para o prompt
-    cinco_professores_str = "\n".join([("{" + f'"nome":"{professor.nome}", "resumo": "{professor.resumo}", "linhas_pesquisa": "{professor.linhas_pesquisa}"' + "}") for professor in cinco_professores])
+    # Converte a lista de cinco professores em uma string formatada para o prompt, com o orçamento de tokens dividido entre eles
+    if USAR_SINTESES:
+        max_tokens = ORCAMENTO_TOKENS_RELEVANCIA // max(1, len(cinco_professores))
+        cinco_professores_str = "\n".join([("{" + f'"id_professor":"{professor.id_professor}", "nome":"{professor.nome}", "sintese": "{base_professores.sintese_professor(professor, max_tokens)}"' + "}") for professor in cinco_professores])
+    else:
+        cinco_professores_str = "\n".join([("{" + f'"id_professor":"{professor.id_professor}", "nome":"{professor.nome}", "resumo": "{professor.resumo}", "linhas_pesquisa": "{professor.linhas_pesquisa}"' + "}") for professor in cinco_professores])
     
     # Invoca o modelo de linguagem estruturado com o prompt e a string dos cinco professores
-    resposta = structured_llm.invoke(prompt + f"\nProfessores: {cinco_professores_str}")
+    with instrumentacao.trecho("relevancia_lote", id=id, professores=len(cinco_professores)):
+        resposta = structured_llm.invoke(prompt + f"\nProfessores: {cinco_professores_str}")
     
     # Retorna a resposta gerada pelo modelo de linguagem
     return resposta
@@ -232,17 +569,19 @@ def inclui_relevancia_professor(lista_relevancia:ListaRelevanciaProfessores, pro
     """
     Atualiza a relevância dos professores na lista de professores fornecida com base na lista de relevância.
 
-    Para cada professor na lista de professores, verifica se ele está presente na lista de relevância.
-    Se estiver presente, atualiza os atributos 'relevante' e 'justificativa_relevancia' do professor.
+    Para cada professor na lista de professores, busca a sua relevância pelo identificador ou, na falta dele, pelo nome normalizado.
+    Se estiver presente, atualiza o atributo 'justificativa_relevancia' do professor.
     Se não estiver presente, imprime uma mensagem informando que o professor não foi encontrado na lista de relevância.
 
     Args:
         lista_relevancia (ListaRelevanciaProfessores): A lista contendo a relevância dos professores.
         professores (list[Professor]): A lista de professores a serem atualizados.
     """
+    relevancias = lista_relevancia.por_chave()
     for professor in professores:
-        professor_na_lista = next((p for p in lista_relevancia.relevancia_professores if p.nome == professor.nome), None)
+        professor_na_lista = relevancias.get(professor.id_professor) or relevancias.get(normaliza_texto(professor.nome or ""))
         if professor_na_lista is not None:
             professor.justificativa_relevancia = professor_na_lista.justificativa
         else:
+            instrumentacao.conta("relevancias_nao_encontradas")
             print(f"Professor {professor.nome} não encontrado na lista de relevância")
\ No newline at end of file
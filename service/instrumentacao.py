@@ -0,0 +1,267 @@
+'''
+Este módulo implementa o rastreamento da definição de bancas: cada requisição gera um rastro com os trechos (etapas, buscas e lotes
+de relevância) e a sua duração, e com os contadores de tokens, chamadas aos LLMs e ao serviço de embeddings, acertos de cache e falhas.
+
+O rastro atual é propagado por contextvars, de forma que as funções instrumentadas não recebem nenhum parâmetro adicional;
+fora de um rastro, `trecho` e `conta` não fazem nada. Os rastros concluídos são gravados em JSON lines
+e acumulados em métricas do processo, que podem ser expostas no formato de texto do Prometheus.
+'''
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Optional
+
+# Arquivo JSON lines onde os rastros concluídos são gravados; não grava se EXPORTAR_RASTROS for falso
+EXPORTAR_RASTROS = True
+CAMINHO_RASTROS = "data/rastros/rastros.jsonl"
+
+_rastro_atual: contextvars.ContextVar[Optional["Rastro"]] = contextvars.ContextVar("rastro_atual", default=None)
+_trecho_atual: contextvars.ContextVar[Optional["Trecho"]] = contextvars.ContextVar("trecho_atual", default=None)
+_trava_arquivo = threading.Lock()
+
+
+class Trecho:
+    '''Classe que representa um trecho de um rastro, com a sua duração, atributos e contadores'''
+    __slots__ = ("nome", "pai", "inicio", "duracao", "atributos", "contadores")
+
+    def __init__(self, nome: str, pai: Optional[str], inicio: float, atributos: dict):
+        self.nome = nome
+        self.pai = pai
+        self.inicio = inicio
+        self.duracao: Optional[float] = None
+        self.atributos = atributos
+        self.contadores: dict[str, float] = {}
+
+    def to_dict(self, inicio_rastro: float) -> dict:
+        return {"nome": self.nome, "pai": self.pai, "inicio": round(self.inicio - inicio_rastro, 4),
+                "duracao": round(self.duracao, 4) if self.duracao is not None else None,
+                "atributos": self.atributos, "contadores": self.contadores}
+
+
+class Rastro:
+    '''Classe que representa o rastro de uma requisição: os seus trechos e os contadores acumulados'''
+
+    def __init__(self, nome: str, atributos: dict):
+        self.id = uuid.uuid4().hex
+        self.nome = nome
+        self.atributos = atributos
+        self.data = time.time()
+        self.inicio = time.perf_counter()
+        self.duracao: Optional[float] = None
+        self.trechos: list[Trecho] = []
+        self.contadores: dict[str, float] = {}
+        # Os lotes de relevância registram trechos e contadores a partir de várias threads
+        self._trava = threading.Lock()
+
+    def adiciona_trecho(self, trecho: Trecho):
+        with self._trava:
+            self.trechos.append(trecho)
+
+    def conta(self, nome: str, valor: float, trecho: Optional[Trecho]):
+        with self._trava:
+            self.contadores[nome] = self.contadores.get(nome, 0) + valor
+            if trecho is not None:
+                trecho.contadores[nome] = trecho.contadores.get(nome, 0) + valor
+
+    def duracoes(self) -> dict[str, float]:
+        '''Retorna a duração total, em segundos, dos trechos de cada nome'''
+        duracoes = {}
+        with self._trava:
+            for trecho in self.trechos:
+                if trecho.duracao is not None:
+                    duracoes[trecho.nome] = duracoes.get(trecho.nome, 0.0) + trecho.duracao
+        return duracoes
+
+    def resumo(self) -> dict:
+        '''Retorna a duração total, a duração por trecho e os contadores do rastro'''
+        return {"id": self.id, "duracao": self.duracao, "trechos": self.duracoes(), "contadores": dict(self.contadores)}
+
+    def to_dict(self) -> dict:
+        with self._trava:
+            return {"id": self.id, "nome": self.nome, "data": self.data, "duracao": self.duracao, "atributos": self.atributos,
+                    "contadores": dict(self.contadores), "trechos": [trecho.to_dict(self.inicio) for trecho in self.trechos]}
+
+
+class MetricasProcesso:
+    '''Classe que acumula os contadores e as durações dos trechos de todos os rastros concluídos no processo'''
+
+    def __init__(self):
+        self.rastros = 0
+        self.contadores: dict[str, float] = {}
+        self.duracoes: dict[str, tuple[float, int]] = {}
+        self._trava = threading.Lock()
+
+    def acumula(self, rastro: Rastro):
+        with self._trava:
+            self.rastros += 1
+            for nome, valor in rastro.contadores.items():
+                self.contadores[nome] = self.contadores.get(nome, 0) + valor
+            for trecho in rastro.trechos:
+                if trecho.duracao is not None:
+                    soma, quantidade = self.duracoes.get(trecho.nome, (0.0, 0))
+                    self.duracoes[trecho.nome] = (soma + trecho.duracao, quantidade + 1)
+            soma, quantidade = self.duracoes.get(rastro.nome, (0.0, 0))
+            self.duracoes[rastro.nome] = (soma + (rastro.duracao or 0.0), quantidade + 1)
+
+    def formato_prometheus(self) -> str:
+        '''Retorna as métricas no formato de texto do Prometheus'''
+        with self._trava:
+            linhas = ["# TYPE banca_rastros_total counter", f"banca_rastros_total {self.rastros}"]
+            for nome, valor in sorted(self.contadores.items()):
+                linhas += [f"# TYPE banca_{nome}_total counter", f"banca_{nome}_total {valor:g}"]
+            linhas.append("# TYPE banca_trecho_duracao_segundos summary")
+            for nome, (soma, quantidade) in sorted(self.duracoes.items()):
+                linhas.append(f'banca_trecho_duracao_segundos_sum{{trecho="{nome}"}} {soma:.6f}')
+                linhas.append(f'banca_trecho_duracao_segundos_count{{trecho="{nome}"}} {quantidade}')
+        return "\n".join(linhas) + "\n"
+
+
+metricas = MetricasProcesso()
+_servidor_metricas: Optional[ThreadingHTTPServer] = None
+_trava_servidor = threading.Lock()
+
+
+@contextmanager
+def rastreia(nome: str, **atributos) -> Iterator[Optional[Rastro]]:
+    """
+    Inicia um rastro para o bloco, ou um trecho do rastro atual se já houver um.
+
+    Ao final do bloco, o rastro é gravado em CAMINHO_RASTROS e acumulado nas métricas do processo.
+    Args:
+        nome (str): O nome do rastro.
+        **atributos: Atributos do rastro, gravados junto com ele.
+    Yields:
+        Rastro | None: O rastro iniciado, ou None se o bloco for um trecho de um rastro já existente.
+    """
+    if _rastro_atual.get() is not None:
+        with trecho(nome, **atributos):
+            yield None
+        return
+
+    rastro = Rastro(nome, atributos)
+    token_rastro = _rastro_atual.set(rastro)
+    token_trecho = _trecho_atual.set(None)
+    try:
+        yield rastro
+    except BaseException as e:
+        rastro.atributos["erro"] = repr(e)
+        raise
+    finally:
+        rastro.duracao = time.perf_counter() - rastro.inicio
+        _trecho_atual.reset(token_trecho)
+        _rastro_atual.reset(token_rastro)
+        metricas.acumula(rastro)
+        if EXPORTAR_RASTROS:
+            exporta_rastro(rastro)
+
+@contextmanager
+def trecho(nome: str, **atributos) -> Iterator[Optional[Trecho]]:
+    """
+    Registra um trecho do rastro atual, com a duração do bloco. Não faz nada fora de um rastro.
+    Args:
+        nome (str): O nome do trecho, ex.: a etapa da definição da banca.
+        **atributos: Atributos do trecho, ex.: a quantidade de consultas de uma busca.
+    Yields:
+        Trecho | None: O trecho registrado, ou None fora de um rastro.
+    """
+    rastro = _rastro_atual.get()
+    if rastro is None:
+        yield None
+        return
+
+    pai = _trecho_atual.get()
+    atual = Trecho(nome, pai.nome if pai is not None else None, time.perf_counter(), atributos)
+    rastro.adiciona_trecho(atual)
+    token = _trecho_atual.set(atual)
+    try:
+        yield atual
+    except BaseException as e:
+        atual.atributos["erro"] = repr(e)
+        raise
+    finally:
+        atual.duracao = time.perf_counter() - atual.inicio
+        _trecho_atual.reset(token)
+
+def conta(nome: str, valor: float = 1):
+    '''Soma o valor ao contador do rastro atual e do trecho atual. Não faz nada fora de um rastro'''
+    rastro = _rastro_atual.get()
+    if rastro is not None and valor:
+        rastro.conta(nome, valor, _trecho_atual.get())
+
+def registra_uso_tokens(uso: Optional[dict]):
+    '''Conta os tokens do prompt e da resposta a partir do `usage_metadata` de uma mensagem do LLM'''
+    if not uso:
+        return
+    conta("tokens_prompt", uso.get("input_tokens", 0))
+    conta("tokens_resposta", uso.get("output_tokens", 0))
+
+def exporta_rastro(rastro: Rastro, caminho: Optional[str] = None):
+    '''Acrescenta o rastro, em uma linha JSON, ao arquivo de rastros'''
+    caminho = caminho or CAMINHO_RASTROS
+    try:
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        linha = json.dumps(rastro.to_dict(), ensure_ascii=False, default=str)
+        with _trava_arquivo, open(caminho, "a", encoding="utf-8") as file:
+            file.write(linha + "\n")
+    except OSError as e:
+        print(f"Erro ao gravar rastro {rastro.id}: {e}")
+
+
+class LLMInstrumentado:
+    '''Classe que envolve um LLM com saída estruturada criado com `include_raw=True`, contando as chamadas e os tokens de cada uma'''
+
+    def __init__(self, structured_llm_raw):
+        self.structured_llm_raw = structured_llm_raw
+
+    def invoke(self, prompt, *args, **kwargs) -> Any:
+        conta("chamadas_llm")
+        with trecho("chamada_llm"):
+            resposta = self.structured_llm_raw.invoke(prompt, *args, **kwargs)
+        # Modelos que ignoram include_raw retornam diretamente a resposta estruturada
+        if not isinstance(resposta, dict) or "parsed" not in resposta:
+            return resposta
+
+        registra_uso_tokens(getattr(resposta.get("raw"), "usage_metadata", None))
+        if resposta.get("parsing_error") is not None:
+            conta("falhas_validacao_llm")
+            raise resposta["parsing_error"]
+        return resposta["parsed"]
+
+
+class _ManipuladorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        corpo = metricas.formato_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass
+
+def inicia_servidor_metricas(porta: int, endereco: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Inicia, em uma thread em segundo plano, o servidor HTTP que expõe as métricas do processo em /metrics.
+    Chamadas seguintes retornam o servidor já iniciado.
+    Args:
+        porta (int): A porta do servidor.
+        endereco (str): O endereço em que o servidor escuta.
+    Returns:
+        ThreadingHTTPServer: O servidor de métricas.
+    """
+    global _servidor_metricas
+    with _trava_servidor:
+        if _servidor_metricas is None:
+            _servidor_metricas = ThreadingHTTPServer((endereco, porta), _ManipuladorMetricas)
+            threading.Thread(target=_servidor_metricas.serve_forever, name="servidor_metricas", daemon=True).start()
+    return _servidor_metricas
@@ -0,0 +1,59 @@
+'''
+Este módulo implementa o limite de taxa das chamadas aos LLMs por balde de fichas (token bucket), compartilhado entre threads.
+'''
+
+import threading
+import time
+
+
+class BaldeTokens:
+    '''Classe que representa um balde de fichas reabastecido a uma taxa constante, até a sua capacidade'''
+
+    def __init__(self, taxa_por_segundo: float, capacidade: float):
+        '''
+        Args:
+            taxa_por_segundo (float): Quantidade de fichas repostas por segundo.
+            capacidade (float): Quantidade máxima de fichas acumuladas, ou seja, o tamanho máximo de uma rajada.
+        '''
+        self.taxa_por_segundo = taxa_por_segundo
+        self.capacidade = capacidade
+        self._fichas = capacidade
+        self._ultima_reposicao = time.monotonic()
+        self._trava = threading.Lock()
+
+    def tenta_adquirir(self, fichas: float = 1) -> bool:
+        '''Consome as fichas se houver fichas suficientes no balde, sem esperar'''
+        with self._trava:
+            self._repoe()
+            if self._fichas >= fichas:
+                self._fichas -= fichas
+                return True
+            return False
+
+    def adquire(self, fichas: float = 1):
+        '''Consome as fichas, esperando até que haja fichas suficientes no balde'''
+        while True:
+            with self._trava:
+                self._repoe()
+                if self._fichas >= fichas:
+                    self._fichas -= fichas
+                    return
+                espera = (fichas - self._fichas) / self.taxa_por_segundo
+            time.sleep(espera)
+
+    def _repoe(self):
+        agora = time.monotonic()
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._ultima_reposicao) * self.taxa_por_segundo)
+        self._ultima_reposicao = agora
+
+
+class LLMComLimite:
+    '''Classe que envolve um LLM com saída estruturada e consome uma ficha do balde antes de cada chamada'''
+
+    def __init__(self, structured_llm, limitador: BaldeTokens):
+        self.structured_llm = structured_llm
+        self.limitador = limitador
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.limitador.adquire()
+        return self.structured_llm.invoke(prompt, *args, **kwargs)
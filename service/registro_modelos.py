@@ -0,0 +1,95 @@
+'''
+Este módulo mantém o registro, compartilhado por todo o processo, dos clientes dos modelos de linguagem e de embeddings, um por modelo.
+Os clientes são criados apenas quando usados pela primeira vez e reutilizados entre as execuções do Streamlit e entre as sessões,
+e as bibliotecas de cada provedor (langchain_openai, langchain_google_vertexai) são importadas apenas quando o provedor é selecionado.
+'''
+
+import threading
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from domain.enums import ModelEnum
+
+# Conexões HTTP mantidas abertas e compartilhadas pelos clientes da OpenAI (chat e embeddings)
+MAX_CONEXOES_HTTP = 32
+
+_llms: dict[str, Any] = {}
+_embeddings: dict[str, Any] = {}
+_cliente_http = None
+_trava = threading.RLock()
+_ambiente_carregado = False
+
+
+def carrega_ambiente():
+    '''Carrega as variáveis do arquivo .env uma única vez por processo'''
+    global _ambiente_carregado
+    with _trava:
+        if not _ambiente_carregado:
+            load_dotenv()
+            _ambiente_carregado = True
+
+def cliente_http():
+    '''Retorna o cliente HTTP compartilhado pelos clientes da OpenAI, com um pool de conexões reutilizadas entre as chamadas'''
+    global _cliente_http
+    with _trava:
+        if _cliente_http is None:
+            import httpx
+            _cliente_http = httpx.Client(limits=httpx.Limits(max_connections=MAX_CONEXOES_HTTP, max_keepalive_connections=MAX_CONEXOES_HTTP))
+        return _cliente_http
+
+def obtem_llm(modelo: str):
+    """
+    Retorna o cliente do modelo de linguagem, criando-o na primeira chamada.
+    Args:
+        modelo (str): O modelo de linguagem (ModelEnum).
+    Returns:
+        BaseChatModel: O cliente do modelo, compartilhado por todas as requisições do processo.
+    """
+    with _trava:
+        if modelo not in _llms:
+            carrega_ambiente()
+            match modelo:
+                case ModelEnum.CHATGPT.value:
+                    from langchain_openai import ChatOpenAI
+                    _llms[modelo] = ChatOpenAI(model="gpt-4o-mini", http_client=cliente_http())
+                case ModelEnum.GEMINI.value:
+                    from langchain_google_vertexai import ChatVertexAI
+                    _llms[modelo] = ChatVertexAI(model="gemini-1.5-flash-001")
+                case _:
+                    raise ValueError(f"Modelo de linguagem desconhecido: {modelo}")
+        return _llms[modelo]
+
+def obtem_embeddings(modelo: str):
+    """
+    Retorna o cliente de embeddings do modelo, criando-o na primeira chamada.
+    Args:
+        modelo (str): O modelo de embeddings: ModelEnum.CHATGPT ou "Vertex".
+    Returns:
+        Embeddings: O cliente de embeddings, compartilhado por todas as requisições do processo.
+    """
+    with _trava:
+        if modelo not in _embeddings:
+            carrega_ambiente()
+            match modelo:
+                case ModelEnum.CHATGPT.value:
+                    from langchain_openai.embeddings import OpenAIEmbeddings
+                    _embeddings[modelo] = OpenAIEmbeddings(http_client=cliente_http())
+                case "Vertex":
+                    from langchain_google_vertexai import VertexAIEmbeddings
+                    _embeddings[modelo] = VertexAIEmbeddings(model="text-embedding-004")
+                case _:
+                    raise ValueError(f"Modelo de embeddings desconhecido: {modelo}")
+        return _embeddings[modelo]
+
+def registra_llm(modelo: str, llm: Optional[Any]):
+    '''Substitui o cliente do modelo de linguagem, ex.: por um modelo simulado nos benchmarks; None remove o cliente registrado'''
+    with _trava:
+        if llm is None:
+            _llms.pop(modelo, None)
+        else:
+            _llms[modelo] = llm
+
+def eh_vertex(embeddings) -> bool:
+    '''Verifica se os embeddings são do Vertex AI sem importar a biblioteca do provedor'''
+    return type(embeddings).__module__.startswith("langchain_google_vertexai")
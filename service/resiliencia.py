@@ -0,0 +1,200 @@
+'''
+Este módulo implementa a camada de resiliência das chamadas aos LLMs com saída estruturada, voltada para a cauda da latência:
+
+- tempo máximo adaptativo de cada etapa, calculado a partir dos percentis das latências observadas na própria etapa;
+- requisição duplicada (hedge) quando uma chamada passa do percentil PERCENTIL_HEDGE da etapa, usando a resposta que chegar primeiro;
+- novas tentativas, com espera exponencial, quando a resposta não é válida para o schema ou a chamada excede o tempo máximo.
+
+As duplicatas consomem fichas de um balde (BaldeTokens) próprio, de forma que, com o serviço lento como um todo,
+as duplicatas não multiplicam as chamadas e não esgotam a cota do provedor. Com um limite global de chamadas, a ficha de cada requisição
+é obtida antes de o tempo começar a contar, e as duplicatas só são enviadas se o limite tiver uma ficha disponível sem espera.
+'''
+
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import TimeoutError as TimeoutFuturo
+
+from service import instrumentacao
+from service.limitador import BaldeTokens
+
+# Latências mais recentes consideradas em cada etapa, e quantidade mínima de latências para usar os percentis
+JANELA_LATENCIAS = 200
+MIN_AMOSTRAS = 20
+# Antes de MIN_AMOSTRAS latências, a duplicata é enviada após LIMIAR_HEDGE_PADRAO segundos e a chamada expira após TIMEOUT_PADRAO
+LIMIAR_HEDGE_PADRAO = 10.0
+TIMEOUT_PADRAO = 60.0
+# A duplicata é enviada quando a chamada passa do percentil PERCENTIL_HEDGE das latências da etapa
+PERCENTIL_HEDGE = 95
+# O tempo máximo é MULTIPLICADOR_TIMEOUT vezes o p99 da etapa, limitado entre TIMEOUT_MINIMO e TIMEOUT_MAXIMO
+MULTIPLICADOR_TIMEOUT = 3.0
+TIMEOUT_MINIMO = 5.0
+TIMEOUT_MAXIMO = 120.0
+# Tentativas de cada chamada e espera, em segundos, antes da segunda tentativa; a espera dobra a cada nova tentativa
+MAX_TENTATIVAS = 3
+ESPERA_BASE_TENTATIVA = 0.5
+
+# Orçamento das duplicatas, compartilhado por todas as etapas do processo: no máximo uma duplicata a cada 2 segundos,
+# com rajadas de até 5; sem duplicatas se None
+ORCAMENTO_HEDGE: BaldeTokens | None = BaldeTokens(taxa_por_segundo=0.5, capacidade=5)
+
+
+class HistoricoLatencias:
+    '''Classe que guarda as latências mais recentes de uma etapa e calcula o limiar das duplicatas e o tempo máximo a partir delas'''
+
+    def __init__(self, janela: int = JANELA_LATENCIAS):
+        self.latencias: deque[float] = deque(maxlen=janela)
+        self._trava = threading.Lock()
+
+    def registra(self, latencia: float):
+        with self._trava:
+            self.latencias.append(latencia)
+
+    def percentil(self, percentil: float) -> float | None:
+        '''Retorna o percentil das latências, em segundos, ou None com menos de MIN_AMOSTRAS latências'''
+        with self._trava:
+            if len(self.latencias) < MIN_AMOSTRAS:
+                return None
+            ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * percentil / 100))]
+
+    def limiar_hedge(self) -> float:
+        '''Retorna o tempo, em segundos, após o qual a duplicata é enviada'''
+        limiar = self.percentil(PERCENTIL_HEDGE)
+        return limiar if limiar is not None else LIMIAR_HEDGE_PADRAO
+
+    def timeout(self) -> float:
+        '''Retorna o tempo máximo, em segundos, de uma chamada, contado a partir do envio da primeira requisição'''
+        p99 = self.percentil(99)
+        if p99 is None:
+            return TIMEOUT_PADRAO
+        return min(TIMEOUT_MAXIMO, max(TIMEOUT_MINIMO, MULTIPLICADOR_TIMEOUT * p99))
+
+
+_historicos: dict[str, HistoricoLatencias] = {}
+_trava_historicos = threading.Lock()
+
+def historico(etapa: str) -> HistoricoLatencias:
+    '''Retorna o histórico de latências da etapa, criando-o na primeira chamada'''
+    with _trava_historicos:
+        if etapa not in _historicos:
+            _historicos[etapa] = HistoricoLatencias()
+        return _historicos[etapa]
+
+def resumo_latencias() -> dict[str, dict]:
+    '''Retorna, para cada etapa, a quantidade de latências observadas, o p50, o limiar das duplicatas e o tempo máximo atuais'''
+    with _trava_historicos:
+        historicos = dict(_historicos)
+    return {etapa: {"amostras": len(hist.latencias), "p50": hist.percentil(50), "limiar_hedge": hist.limiar_hedge(), "timeout": hist.timeout()}
+            for etapa, hist in historicos.items()}
+
+
+class LLMResiliente:
+    '''Classe que envolve um LLM com saída estruturada com tempo máximo adaptativo, duplicatas das chamadas lentas e novas tentativas'''
+
+    def __init__(self, structured_llm, etapa: str, orcamento_hedge: BaldeTokens | None = None, limitador: BaldeTokens | None = None):
+        '''
+        Args:
+            structured_llm: O LLM com saída estruturada, que levanta ValueError para respostas inválidas.
+            etapa (str): O nome da etapa, ex.: o modelo e o schema da resposta; as latências são observadas por etapa.
+            orcamento_hedge (BaldeTokens | None): O balde consumido por cada duplicata; sem duplicatas se None.
+            limitador (BaldeTokens | None): O limite global de chamadas ao LLM. A ficha de cada requisição é obtida antes de o tempo
+                começar a contar, de forma que a espera na fila do limite não dispara duplicatas nem esgota o tempo máximo;
+                as duplicatas só são enviadas se houver uma ficha disponível sem espera.
+        '''
+        self.structured_llm = structured_llm
+        self.etapa = etapa
+        self.historico = historico(etapa)
+        self.orcamento_hedge = orcamento_hedge
+        self.limitador = limitador
+
+    def invoke(self, prompt, *args, **kwargs):
+        '''Chama o LLM, repetindo a chamada com espera exponencial se a resposta for inválida ou exceder o tempo máximo'''
+        for tentativa in range(MAX_TENTATIVAS):
+            try:
+                return self.invoke_com_hedge(prompt, *args, **kwargs)
+            except (ValueError, TimeoutError) as e:
+                if tentativa == MAX_TENTATIVAS - 1:
+                    raise
+                instrumentacao.conta("novas_tentativas_llm")
+                espera = ESPERA_BASE_TENTATIVA * 2 ** tentativa
+                print(f"Tentativa {tentativa + 1} de {self.etapa} falhou ({e!r}), nova tentativa em {espera:.1f}s")
+                time.sleep(espera + random.uniform(0, ESPERA_BASE_TENTATIVA))
+
+    def invoke_com_hedge(self, prompt, *args, **kwargs):
+        """
+        Envia a requisição e, se ela passar do limiar da etapa e houver orçamento, uma duplicata, retornando a primeira resposta válida.
+        A requisição que perder continua em segundo plano e tem a sua resposta descartada.
+        Returns:
+            A resposta estruturada do LLM.
+        Raises:
+            TimeoutError: Se nenhuma requisição responder dentro do tempo máximo da etapa.
+        """
+        if self.limitador is not None:
+            self.limitador.adquire()
+        limite = time.monotonic() + self.historico.timeout()
+        # Sinaliza às requisições que ainda não chamaram o LLM que a chamada já terminou, com uma resposta ou por tempo esgotado
+        encerrada = threading.Event()
+        try:
+            requisicoes = [self.envia(limite, encerrada, prompt, *args, **kwargs)]
+            try:
+                return requisicoes[0].result(timeout=self.historico.limiar_hedge())
+            except TimeoutFuturo:
+                pass
+
+            if self.pode_duplicar():
+                instrumentacao.conta("hedges_llm")
+                requisicoes.append(self.envia(limite, encerrada, prompt, *args, **kwargs))
+
+            pendentes = set(requisicoes)
+            erro = None
+            while pendentes:
+                concluidas, pendentes = wait(pendentes, timeout=max(0.0, limite - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not concluidas:
+                    break
+                for requisicao in concluidas:
+                    if requisicao.exception() is None:
+                        if requisicao is not requisicoes[0]:
+                            instrumentacao.conta("hedges_vencedores_llm")
+                        return requisicao.result()
+                    erro = requisicao.exception()
+            if erro is not None and not pendentes:
+                raise erro
+            instrumentacao.conta("timeouts_llm")
+            raise TimeoutError(f"{self.etapa} excedeu o tempo máximo de {self.historico.timeout():.1f}s")
+        finally:
+            encerrada.set()
+
+    def pode_duplicar(self) -> bool:
+        '''Consome, sem esperar, uma ficha do orçamento das duplicatas e uma do limite global de chamadas, se houver ambas'''
+        if self.orcamento_hedge is None or not self.orcamento_hedge.tenta_adquirir():
+            return False
+        return self.limitador is None or self.limitador.tenta_adquirir()
+
+    def envia(self, limite: float, encerrada: threading.Event, prompt, *args, **kwargs) -> Future:
+        '''
+        Executa uma requisição em uma thread própria, com uma cópia do contexto para que ela seja registrada no rastro atual.
+        A requisição não chama o LLM se, ao começar, a chamada já estiver encerrada ou o tempo máximo `limite` já tiver passado.
+        '''
+        futuro = Future()
+        contexto = contextvars.copy_context()
+
+        def executa():
+            if encerrada.is_set() or time.monotonic() >= limite:
+                futuro.set_exception(TimeoutError(f"{self.etapa} encerrada antes do envio da requisição"))
+                return
+            inicio = time.perf_counter()
+            try:
+                resposta = self.structured_llm.invoke(prompt, *args, **kwargs)
+            except BaseException as e:
+                futuro.set_exception(e)
+                return
+            # Apenas as respostas válidas entram no histórico, inclusive as das requisições que perderam para a duplicata
+            self.historico.registra(time.perf_counter() - inicio)
+            futuro.set_result(resposta)
+
+        threading.Thread(target=contexto.run, args=(executa,), name=f"llm_{self.etapa}", daemon=True).start()
+        return futuro
@@ -0,0 +1,144 @@
+'''
+Este módulo gera as sínteses extrativas dos professores: um texto curto, limitado em tokens, com as linhas de pesquisa
+e as frases do resumo que melhor descrevem os temas do professor, enviado ao LLM na checagem de relevância no lugar do currículo completo.
+
+As sínteses são geradas uma única vez, fora da aplicação, e gravadas em um arquivo JSON ao lado do catálogo,
+indexadas pelo identificador do professor e acompanhadas do hash do conteúdo de origem, para que sejam refeitas apenas quando ele muda.
+'''
+
+import hashlib
+import json
+import math
+import os
+import re
+from typing import Iterable, Optional
+
+from domain.catalogo import CatalogoProfessores
+from domain.texto import normaliza_texto
+
+# Versão do algoritmo de síntese; alterações no algoritmo devem incrementá-la para que as sínteses gravadas sejam refeitas
+VERSAO_SINTESE = 1
+# Aproximação da quantidade de caracteres por token dos modelos de linguagem em textos em português
+CARACTERES_POR_TOKEN = 4
+
+# Termos que indicam frases sobre os temas de atuação do professor, e não sobre a sua carreira
+TERMOS_TEMAS = ("experiencia", "enfase", "temas", "atuando", "atua", "pesquisa", "interesse", "estuda", "desenvolve", "trabalha com")
+# Termos que indicam frases sobre a formação e os cargos do professor
+TERMOS_CARREIRA = ("possui graduacao", "doutorado", "mestrado", "pos-doutorado", "livre docencia", "professor", "docente", "credenciado",
+                   "diretor", "coordenador", "chefe", "bolsista", "atualmente e")
+
+_SEPARADOR_FRASES = re.compile(r"(?<=[.!?;])\s+")
+_PALAVRAS = re.compile(r"\w{4,}")
+
+
+def estima_tokens(texto: str) -> int:
+    '''Estima a quantidade de tokens de um texto a partir da quantidade de caracteres'''
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+def corta_texto(texto: str, max_tokens: int) -> str:
+    '''Corta o texto no último espaço antes do limite de tokens, indicando o corte com reticências'''
+    max_caracteres = max_tokens * CARACTERES_POR_TOKEN
+    if len(texto) <= max_caracteres:
+        return texto
+    corte = texto.rfind(" ", 0, max_caracteres - 1)
+    return texto[:corte if corte > 0 else max_caracteres - 1].rstrip(" ,;:.") + "…"
+
+def pontua_frase(frase: str, termos_linhas: set[str]) -> float:
+    '''Pontua uma frase do resumo pela presença de termos sobre os temas do professor e das palavras das suas linhas de pesquisa'''
+    normalizada = normaliza_texto(frase)
+    pontuacao = 2.0 * sum(termo in normalizada for termo in TERMOS_TEMAS)
+    pontuacao += len(termos_linhas.intersection(_PALAVRAS.findall(normalizada)))
+    pontuacao -= sum(termo in normalizada for termo in TERMOS_CARREIRA)
+    return pontuacao
+
+def gera_sintese(resumo: Optional[str], linhas_pesquisa: Iterable[str], max_tokens: int) -> str:
+    """
+    Gera a síntese extrativa de um professor, com no máximo max_tokens tokens estimados.
+
+    As linhas de pesquisa ocupam no máximo um terço do limite. O restante é preenchido com as frases do resumo
+    de maior pontuação, mantidas na ordem original.
+    Args:
+        resumo (str | None): O resumo do currículo do professor.
+        linhas_pesquisa (Iterable[str]): As linhas de pesquisa do professor.
+        max_tokens (int): A quantidade máxima de tokens estimados da síntese.
+    Returns:
+        str: A síntese do professor.
+    """
+    linhas_pesquisa = list(dict.fromkeys(linha.strip() for linha in linhas_pesquisa if linha and linha.strip()))
+    sintese = corta_texto(f"Linhas de pesquisa: {'; '.join(linhas_pesquisa)}.", max(1, max_tokens // 3)) if linhas_pesquisa else ""
+
+    frases = [frase.strip() for frase in _SEPARADOR_FRASES.split(resumo or "") if frase.strip()]
+    if not frases:
+        return sintese
+
+    # Seleciona as frases de maior pontuação que cabem no limite, desempatando pela posição no resumo;
+    # frases sem relação com os temas do professor são usadas apenas se nenhuma outra frase for selecionada
+    termos_linhas = set(_PALAVRAS.findall(normaliza_texto(" ".join(linhas_pesquisa))))
+    pontuacoes = [pontua_frase(frase, termos_linhas) for frase in frases]
+    ranking = sorted(range(len(frases)), key=lambda i: (-pontuacoes[i], i))
+    restante = max_tokens - estima_tokens(sintese) - 1
+    selecionadas = []
+    for somente_temas in (True, False):
+        for i in ranking:
+            custo = estima_tokens(frases[i]) + 1
+            if custo <= restante and (pontuacoes[i] > 0 or not somente_temas):
+                selecionadas.append(i)
+                restante -= custo
+        if selecionadas:
+            break
+
+    # Se nenhuma frase couber inteira, usa o início da frase de maior pontuação
+    resumo_sintese = " ".join(frases[i] for i in sorted(selecionadas)) or corta_texto(frases[ranking[0]], max(1, restante))
+    return f"{sintese} {resumo_sintese}".strip()
+
+def hash_sintese(resumo: Optional[str], linhas_pesquisa: Iterable[str]) -> str:
+    '''Calcula o hash SHA-256 do conteúdo de origem da síntese de um professor e da versão do algoritmo de síntese'''
+    conteudo = {"resumo": resumo, "linhas_pesquisa": list(linhas_pesquisa), "versao_sintese": VERSAO_SINTESE}
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def abre_sinteses(caminho: str) -> dict:
+    """
+    Lê o arquivo de sínteses.
+    Args:
+        caminho (str): O caminho do arquivo JSON de sínteses.
+    Returns:
+        dict: O conteúdo do arquivo, com o limite de tokens ("max_tokens") e as sínteses ("sinteses") indexadas pelo identificador
+            de cada professor, cada uma com o hash do conteúdo de origem ("hash") e o texto ("texto"); vazio se o arquivo não existir.
+    """
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def atualiza_sinteses(caminho: str, catalogo: CatalogoProfessores, max_tokens: int) -> tuple[int, int]:
+    """
+    Gera as sínteses dos professores novos ou alterados do catálogo e remove as dos professores ausentes,
+    regravando o arquivo de sínteses. Todas são refeitas se o limite de tokens mudar.
+    Args:
+        caminho (str): O caminho do arquivo JSON de sínteses.
+        catalogo (CatalogoProfessores): O catálogo de professores.
+        max_tokens (int): A quantidade máxima de tokens estimados de cada síntese.
+    Returns:
+        tuple[int, int]: A quantidade de sínteses geradas e a de sínteses removidas.
+    """
+    existentes = abre_sinteses(caminho)
+    anteriores = existentes.get("sinteses", {}) if existentes.get("max_tokens") == max_tokens else {}
+
+    sinteses, geradas = {}, 0
+    for registro in catalogo:
+        hash_atual = hash_sintese(registro.resumo, registro.linhas_pesquisa)
+        anterior = anteriores.get(registro.id_professor)
+        if anterior is not None and anterior.get("hash") == hash_atual:
+            sinteses[registro.id_professor] = anterior
+        else:
+            sinteses[registro.id_professor] = {"hash": hash_atual, "texto": gera_sintese(registro.resumo, registro.linhas_pesquisa, max_tokens)}
+            geradas += 1
+    removidas = len(set(existentes.get("sinteses", {})) - set(sinteses))
+
+    # Grava em um arquivo temporário e o substitui, para que a aplicação nunca leia um arquivo incompleto
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as file:
+        json.dump({"versao_sintese": VERSAO_SINTESE, "max_tokens": max_tokens, "sinteses": sinteses}, file, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return geradas, removidas
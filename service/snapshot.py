@@ -0,0 +1,192 @@
+'''
+Este módulo grava e abre o snapshot binário de inicialização: o catálogo de professores e uma matriz de embeddings por modelo em um único arquivo.
+O arquivo é aberto com mmap, de forma que a aplicação inicia sem ler o JSON nem abrir o Chroma, e vários processos compartilham as mesmas páginas de memória.
+
+Formato (little-endian):
+    MAGICO (8 bytes) | versão (uint32) | tamanho do cabeçalho (uint32) | cabeçalho JSON | seções alinhadas em ALINHAMENTO bytes
+As seções são: ids dos professores (TAMANHO_ID bytes ASCII cada), deslocamentos dos registros (int64, N+1),
+registros JSON concatenados e uma matriz de embeddings normalizada por modelo, na ordem dos ids.
+'''
+
+import contextlib
+import json
+import mmap
+import os
+import struct
+import numpy as np
+from typing import Iterator, Optional
+
+from domain.catalogo import CatalogoProfessores, RegistroProfessor
+from service.busca_numpy import normaliza_linhas
+
+MAGICO = b"BANCASNP"
+VERSAO_SNAPSHOT = 1
+ALINHAMENTO = 64
+# Os ids dos professores são hashes SHA-1 hexadecimais
+TAMANHO_ID = 40
+
+
+class CatalogoSnapshot(CatalogoProfessores):
+    '''Classe que representa o catálogo de professores lido do snapshot, decodificando cada registro apenas quando acessado'''
+    __slots__ = ("indices", "deslocamentos", "dados")
+
+    def __init__(self, ids: list[str], deslocamentos: np.ndarray, dados: memoryview):
+        super().__init__({})
+        self.indices = {id: i for i, id in enumerate(ids)}
+        self.deslocamentos = deslocamentos
+        self.dados = dados
+
+    def registro(self, indice: int) -> RegistroProfessor:
+        '''Decodifica o registro da linha `indice` do snapshot'''
+        id, nome, resumo, linhas_pesquisa, foto = json.loads(bytes(self.dados[self.deslocamentos[indice]: self.deslocamentos[indice + 1]]))
+        return RegistroProfessor(id_professor=id, nome=nome, resumo=resumo, linhas_pesquisa=tuple(linhas_pesquisa), foto=foto)
+
+    def get(self, id_professor: Optional[str]) -> Optional[RegistroProfessor]:
+        indice = self.indices.get(id_professor)
+        return self.registro(indice) if indice is not None else None
+
+    def __getitem__(self, id_professor: str) -> RegistroProfessor:
+        return self.registro(self.indices[id_professor])
+
+    def __contains__(self, id_professor: str) -> bool:
+        return id_professor in self.indices
+
+    def __iter__(self) -> Iterator[RegistroProfessor]:
+        return (self.registro(i) for i in range(len(self.indices)))
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+class Snapshot:
+    '''Classe que representa um snapshot aberto com mmap'''
+
+    def __init__(self, arquivo, mapa: mmap.mmap, cabecalho: dict, catalogo: CatalogoSnapshot):
+        self.arquivo = arquivo
+        self.mapa = mapa
+        self.cabecalho = cabecalho
+        self.catalogo = catalogo
+        self.ids = list(catalogo.indices)
+
+    def modelos(self) -> list[str]:
+        '''Retorna os modelos de embeddings presentes no snapshot'''
+        return list(self.cabecalho["modelos"])
+
+    def matriz(self, modelo: str) -> Optional[np.ndarray]:
+        '''
+        Retorna a matriz de embeddings normalizada do modelo, ou None se o modelo não estiver no snapshot.
+        Matrizes float32 são uma visão direta do mmap; matrizes float16 são convertidas para float32 em memória.
+        '''
+        secao = self.cabecalho["modelos"].get(modelo)
+        if secao is None:
+            return None
+        matriz = np.frombuffer(self.mapa, dtype=secao["dtype"], count=secao["linhas"] * secao["dimensao"], offset=secao["offset"])
+        matriz = matriz.reshape(secao["linhas"], secao["dimensao"])
+        return matriz if matriz.dtype == np.float32 else matriz.astype(np.float32)
+
+    def espaco(self, modelo: str) -> str:
+        '''Retorna a métrica de distância da coleção do Chroma de onde os embeddings do modelo foram extraídos'''
+        return self.cabecalho["modelos"][modelo]["espaco"]
+
+
+def grava_snapshot(caminho: str, catalogo: CatalogoProfessores, hash_fonte: str,
+                   modelos: dict[str, tuple[np.ndarray, str]], dtype: str = "float32"):
+    '''
+    Grava o snapshot do catálogo e das matrizes de embeddings.
+    Args:
+        caminho (str): O caminho do arquivo de snapshot.
+        catalogo (CatalogoProfessores): O catálogo de professores.
+        hash_fonte (str): O hash do arquivo JSON de onde o catálogo foi lido, usado para validar o snapshot.
+        modelos (dict[str, tuple[np.ndarray, str]]): Para cada modelo, a matriz de embeddings na ordem do catálogo e a métrica de distância.
+        dtype (str): O tipo dos valores das matrizes no arquivo ("float32" ou "float16").
+    '''
+    registros = list(catalogo)
+    dados = bytearray()
+    deslocamentos = [0]
+    for registro in registros:
+        dados += json.dumps([registro.id_professor, registro.nome, registro.resumo, list(registro.linhas_pesquisa), registro.foto],
+                            ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        deslocamentos.append(len(dados))
+
+    secoes = [b"".join(registro.id_professor.encode("ascii").ljust(TAMANHO_ID) for registro in registros),
+              np.asarray(deslocamentos, dtype="<i8").tobytes(), bytes(dados)]
+    for matriz, _ in modelos.values():
+        secoes.append(np.ascontiguousarray(normaliza_linhas(matriz), dtype=np.dtype(dtype).newbyteorder("<")).tobytes())
+
+    # O cabeçalho é gerado duas vezes: a primeira apenas para descobrir o seu tamanho e calcular os deslocamentos das seções
+    def monta_cabecalho(offsets: list[int]) -> dict:
+        return {"hash_fonte": hash_fonte, "linhas": len(registros),
+                "ids": offsets[0], "deslocamentos": offsets[1], "registros": offsets[2],
+                "modelos": {modelo: {"offset": offsets[3 + i], "linhas": len(registros), "dimensao": int(matriz.shape[1]),
+                                     "dtype": dtype, "espaco": espaco}
+                            for i, (modelo, (matriz, espaco)) in enumerate(modelos.items())}}
+
+    offsets = [0] * len(secoes)
+    for _ in range(2):
+        cabecalho = json.dumps(monta_cabecalho(offsets)).encode("utf-8")
+        posicao = alinha(len(MAGICO) + 8 + len(cabecalho) + ALINHAMENTO)
+        for i, secao in enumerate(secoes):
+            offsets[i] = posicao
+            posicao = alinha(posicao + len(secao))
+    cabecalho = json.dumps(monta_cabecalho(offsets)).encode("utf-8")
+
+    with open(caminho + ".tmp", "wb") as file:
+        file.write(MAGICO + struct.pack("<II", VERSAO_SNAPSHOT, len(cabecalho)) + cabecalho)
+        for offset, secao in zip(offsets, secoes):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(secao)
+    os.replace(caminho + ".tmp", caminho)
+
+def abre_snapshot(caminho: str, hash_fonte: str) -> Optional[Snapshot]:
+    '''
+    Abre o snapshot com mmap, verificando o formato, a versão e o hash do arquivo JSON de origem.
+    Args:
+        caminho (str): O caminho do arquivo de snapshot.
+        hash_fonte (str): O hash atual do arquivo JSON de professores.
+    Returns:
+        Snapshot | None: O snapshot aberto, ou None se o arquivo não existir ou não for válido para o JSON atual.
+    '''
+    try:
+        arquivo = open(caminho, "rb")
+    except FileNotFoundError:
+        return None
+
+    # O arquivo e o mmap são fechados em todos os retornos sem snapshot; com um snapshot válido, passam a pertencer a ele
+    with contextlib.ExitStack() as pilha:
+        pilha.enter_context(arquivo)
+        try:
+            mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            pilha.callback(fecha_mapa, mapa)
+            magico, (versao, tamanho_cabecalho) = mapa[:len(MAGICO)], struct.unpack_from("<II", mapa, len(MAGICO))
+            if magico != MAGICO or versao != VERSAO_SNAPSHOT:
+                print(f"Snapshot {caminho} ignorado: formato ou versão incompatível")
+                return None
+
+            inicio = len(MAGICO) + 8
+            cabecalho = json.loads(mapa[inicio: inicio + tamanho_cabecalho])
+            if cabecalho["hash_fonte"] != hash_fonte:
+                print(f"Snapshot {caminho} ignorado: gerado a partir de outra versão do arquivo de professores")
+                return None
+
+            linhas = cabecalho["linhas"]
+            ids = mapa[cabecalho["ids"]: cabecalho["ids"] + linhas * TAMANHO_ID].decode("ascii")
+            ids = [ids[i: i + TAMANHO_ID].rstrip() for i in range(0, len(ids), TAMANHO_ID)]
+            deslocamentos = np.frombuffer(mapa, dtype="<i8", count=linhas + 1, offset=cabecalho["deslocamentos"])
+            dados = memoryview(mapa)[cabecalho["registros"]: cabecalho["registros"] + int(deslocamentos[-1])]
+            snap = Snapshot(arquivo, mapa, cabecalho, CatalogoSnapshot(ids, deslocamentos, dados))
+            pilha.pop_all()
+            return snap
+        except Exception as e:
+            print(f"Snapshot {caminho} ignorado: {e}")
+            return None
+
+def fecha_mapa(mapa: mmap.mmap):
+    '''Fecha o mmap; se ainda houver visões sobre ele (ex.: um erro após criá-las), ele é liberado junto com as visões'''
+    try:
+        mapa.close()
+    except BufferError:
+        pass
+
+def alinha(posicao: int) -> int:
+    '''Arredonda a posição para o próximo múltiplo de ALINHAMENTO'''
+    return (posicao + ALINHAMENTO - 1) // ALINHAMENTO * ALINHAMENTO